@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+'''
+Copyright (C) 2012, Florian Festi
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+'''
+"""NACA airfoil sections
+
+Usage: airfoil.py [-p POINTS] [-s SPACING] [-o DIRECTORY] NUMBERS...
+
+Supports 4 digit (2412), 5 digit (23012) and reflexed 5 digit (23112)
+sections. The 6 series are rejected, their thickness distributions are
+only published as tables. Profiles are normalized to a chord of 1.0 and
+run from the trailing edge over the upper side to the leading edge and
+back over the lower side, like in the Selig format. They are kept in
+memory and on disk, so rendering the same section again does not
+recompute it.
+
+The command line writes the coordinates of the sections as .dat files.
+"""
+import sys
+import os
+import re
+import math
+import hashlib
+from array import array
+from optparse import OptionParser
+
+from hotwirecore import FlatCache
+
+spacings = ("cosine", "linear")
+
+# 5 digit mean lines: position of max. camber -> m, k1
+_camber5 = {
+    1 : (0.0580, 361.400),
+    2 : (0.1260, 51.640),
+    3 : (0.2025, 15.957),
+    4 : (0.2900, 6.643),
+    5 : (0.3910, 3.230),
+    }
+
+# reflexed 5 digit mean lines: position of max. camber -> m, k1, k2/k1
+_camber5reflex = {
+    2 : (0.1300, 51.990, 0.000764),
+    3 : (0.2170, 15.793, 0.00677),
+    4 : (0.3180, 6.520, 0.0303),
+    5 : (0.4410, 3.191, 0.1355),
+    }
+
+def parse(number):
+    """Split a NACA designation into thickness distribution, mean line and
+    thickness
+    :return:	(thickness parameters, camber parameters, thickness)
+    """
+    if re.match(r"^\d{4}$", number):
+        m = float(number[0]) / 100.0
+        p = float(number[1]) / 10.0
+        return ("4",), ("4", m, p), float(number[2:]) / 100.0
+    if re.match(r"^\d{5}$", number):
+        cl = int(number[0]) * 0.15
+        p, q = int(number[1]), int(number[2])
+        if q == 0 and p in _camber5:
+            camber = ("5",) + _camber5[p] + (cl,)
+        elif q == 1 and p in _camber5reflex:
+            camber = ("5r",) + _camber5reflex[p] + (cl,)
+        else:
+            raise ValueError("Unknown 5 digit mean line: %r" % number)
+        return ("4",), camber, float(number[3:]) / 100.0
+    if re.match(r"^6\d(?:\(\d\)|_\d)?-\d{3}$", number):
+        raise ValueError("6 series sections are not supported: %r" % number)
+    raise ValueError("Unknown NACA number %r" % number)
+
+def chordPositions(points, spacing="cosine"):
+    """x positions of the points of one side
+    :param spacing:	"cosine" for more points at leading and trailing
+    			edge or "linear"
+    :return:		list of points+1 floats from 0.0 to 1.0
+    """
+    if spacing == "cosine":
+        return [0.5 * (1.0 - math.cos(math.pi * i / points))
+                for i in xrange(points + 1)]
+    elif spacing == "linear":
+        return [float(i) / points for i in xrange(points + 1)]
+    raise ValueError("Unknown spacing %r" % spacing)
+
+def _thickness(kind, x):
+    """Half thickness of a 20% thick section at the positions x"""
+    sqrt = math.sqrt
+    return [0.2969*sqrt(xx) - 0.1260*xx - 0.3516*pow(xx,2) +
+            0.2843*pow(xx,3) - 0.1036*pow(xx,4) for xx in x]
+
+def _camber(kind, x):
+    """Mean line and its slope at the positions x"""
+    zc = []
+    dzc = []
+    if kind[0] == "4":
+        m, p = kind[1:]
+        if p == 0:
+            return [0.0] * len(x), [0.0] * len(x)
+        for xx in x:
+            if xx <= p:
+                zc.append(m/pow(p,2)*xx*(2*p-xx))
+                dzc.append(m/pow(p,2)*(2*p-2*xx))
+            else:
+                zc.append(m/pow(1-p,2)*(1-2*p+xx)*(1-xx))
+                dzc.append(m/pow(1-p,2)*(2*p-2*xx))
+    elif kind[0] == "5":
+        m, k1, cl = kind[1:]
+        f = cl / 0.3 * k1 / 6.0
+        for xx in x:
+            if xx < m:
+                zc.append(f*(xx**3 - 3*m*xx**2 + m**2*(3-m)*xx))
+                dzc.append(f*(3*xx**2 - 6*m*xx + m**2*(3-m)))
+            else:
+                zc.append(f*m**3*(1-xx))
+                dzc.append(-f*m**3)
+    elif kind[0] == "5r":
+        m, k1, k21, cl = kind[1:]
+        f = cl / 0.3 * k1 / 6.0
+        c = k21 * (1-m)**3 + m**3
+        for xx in x:
+            k = 1.0
+            if xx >= m:
+                k = k21
+            zc.append(f*(k*(xx-m)**3 - c*xx + m**3))
+            dzc.append(f*(3*k*(xx-m)**2 - c))
+    return zc, dzc
+
+def sections(numbers, points, spacing="cosine"):
+    """Compute several profiles in one go, sharing the chord positions and
+    thickness distributions
+    :param numbers:	list of NACA numbers as strings
+    :param points:	points per side
+    :return:		list of tuples of 2*points+1 (x, y) tuples
+    """
+    x = chordPositions(points, spacing)
+    thicknesses = {}
+    result = []
+    sqrt = math.sqrt
+    for number in numbers:
+        tkind, ckind, t = parse(number)
+        if tkind not in thicknesses:
+            thicknesses[tkind] = _thickness(tkind, x)
+        zc, dzc = _camber(ckind, x)
+        # thickness perpendicular to the mean line:
+        # cos(atan(d)) = 1/sqrt(1+d*d), sin(atan(d)) = d/sqrt(1+d*d)
+        ny = [5*t*yy / sqrt(1.0 + d*d) for yy, d in zip(thicknesses[tkind], dzc)]
+        nx = [yy * d for yy, d in zip(ny, dzc)]
+        upper = zip([xx - dx for xx, dx in zip(x, nx)],
+                    [zz + dy for zz, dy in zip(zc, ny)])
+        lower = zip([xx + dx for xx, dx in zip(x, nx)],
+                    [zz - dy for zz, dy in zip(zc, ny)])
+        upper.reverse()
+        result.append(tuple(upper + lower[1:]))
+    return result
+
+def placement(size, angle=0.0, origin=(0.0, 0.0)):
+    """Transformation moving origin of a normalized profile to (0, 0),
+    scaling it to size and rotating it by angle degrees
+    :return:	2x3 matrix
+    """
+    a = math.radians(angle)
+    c = math.cos(a) * size
+    s = math.sin(a) * size
+    x, y = origin
+    return [[c, -s, -c*x + s*y], [s, c, -s*x - c*y]]
+
+def transform(points, matrix):
+    """Apply a 2x3 matrix to all points
+    :return:	list of [x, y] lists
+    """
+    (a, b, c), (d, e, f) = matrix
+    return [[a*x + b*y + c, d*x + e*y + f] for x, y in points]
+
+class ProfileCache(FlatCache):
+    """Cache for normalized profiles
+
+    Profiles are returned as tuples of (x, y) tuples. The same tuple is
+    handed to every caller, so it is never copied - and cannot be changed.
+    """
+
+    version = "2"
+
+    def __init__(self, directory=None, maxsize=16<<20, maxentries=64):
+        FlatCache.__init__(self, directory, maxsize, maxentries)
+
+    def key(self, number, points, spacing):
+        return hashlib.sha1("%s\0%i\0%s\0%s" % (
+                number, points, spacing, self.version)).hexdigest()
+
+    def get(self, key):
+        """Return tuple of (x, y) tuples or None"""
+        if key not in self.entries and FlatCache.get(self, key) is None:
+            return None
+        profile = self.entries.pop(key)
+        self.entries[key] = profile
+        return profile
+
+    def _remember(self, key, data):
+        FlatCache._remember(self, key, tuple(zip(data[0::2], data[1::2])))
+
+_cache = None
+
+def defaultCache():
+    """Cache shared by all callers, stored in ~/.cache/nacafoil"""
+    global _cache
+    if _cache is None:
+        _cache = ProfileCache(os.path.expanduser("~/.cache/nacafoil"))
+    return _cache
+
+def profiles(numbers, points, spacing="cosine", cache=None):
+    """Normalized profiles of NACA sections, computing the ones not in the
+    cache in one go
+    :param numbers:	list of NACA numbers as strings
+    :param points:	points per side
+    :param spacing:	"cosine" or "linear", see chordPositions()
+    :param cache:	ProfileCache, None for the default cache
+    :return:		list of tuples of 2*points+1 (x, y) tuples, shared
+    			with other callers
+    """
+    if spacing not in spacings:
+        raise ValueError("Unknown spacing %r" % spacing)
+    if cache is None:
+        cache = defaultCache()
+    # unsupported numbers may still be on disk from older versions
+    for number in numbers:
+        parse(number)
+    keys = [cache.key(number, points, spacing) for number in numbers]
+    result = [cache.get(key) for key in keys]
+    todo = [i for i, r in enumerate(result) if r is None]
+    new = sections([numbers[i] for i in todo], points, spacing)
+    for i, pts in zip(todo, new):
+        data = array('d')
+        for pt in pts:
+            data.extend(pt)
+        cache.put(keys[i], data)
+        result[i] = cache.get(keys[i])
+    return result
+
+def profile(number, points, spacing="cosine", cache=None):
+    """Normalized profile of a NACA section, see profiles()"""
+    return profiles([number], points, spacing, cache)[0]
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage="%prog [options] NUMBERS...")
+    parser.add_option("-p", "--points", action="store", type="int",
+                      dest="points", default=100, help="Points per side")
+    parser.add_option("-s", "--spacing", action="store", type="choice",
+                      choices=spacings, dest="spacing", default="cosine")
+    parser.add_option("-o", "--output", action="store", type="string",
+                      dest="output", default="",
+                      help="Directory for the .dat files, stdout if not given")
+    options, args = parser.parse_args(argv)
+    if not args:
+        parser.error("No NACA numbers given")
+    try:
+        result = sections(args, options.points, options.spacing)
+    except ValueError, e:
+        parser.error(str(e))
+    for number, pts in zip(args, result):
+        name = "NACA %s" % number
+        lines = [name + "\n"] + ["%.6f %.6f\n" % pt for pt in pts]
+        if options.output:
+            f = open(os.path.join(options.output, "naca%s.dat" % number), "w")
+            f.writelines(lines)
+            f.close()
+        else:
+            sys.stdout.writelines(lines)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 encoding=utf-8 textwidth=99
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+'''
+Copyright (C) 2012, Florian Festi
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+'''
+"""Benchmark the SVG to G-code pipeline on synthetic documents
+
+Usage: benchmark.py [-c CASES] [-s SIZES] [-o FILE]
+
+Every case is run at every size in a fresh process, so the peak memory
+(maximal resident set size) is measured per run. Results are written as
+JSON.
+"""
+import sys
+import os
+import json
+import math
+import time
+import random
+import platform
+import resource
+import multiprocessing
+from optparse import OptionParser
+
+import inkex
+import hotwire
+from gcodewriter import GCodeWriter
+
+def glyphs(n):
+    """n small closed outlines made of cubic splines, like lettering"""
+    paths = []
+    k = 0.5523 # control point distance for a quarter circle
+    cols = int(math.ceil(math.sqrt(n)))
+    for i in xrange(n):
+        x = 20.0 * (i % cols)
+        y = 20.0 * (i // cols)
+        r = 6.0
+        paths.append(
+            "M %f,%f C %f,%f %f,%f %f,%f C %f,%f %f,%f %f,%f "
+            "C %f,%f %f,%f %f,%f C %f,%f %f,%f %f,%f" % (
+                x+r, y,
+                x+r, y+k*r, x+k*r, y+r, x, y+r,
+                x-k*r, y+r, x-r, y+k*r, x-r, y,
+                x-r, y-k*r, x-k*r, y-r, x, y-r,
+                x+k*r, y-r, x+r, y-k*r, x+r, y))
+    return [paths]
+
+def splines(n):
+    """Four long random splines with n cubic segments each"""
+    rnd = random.Random(n)
+    paths = []
+    for i in xrange(4):
+        x, y = 0.0, 200.0 * i
+        d = ["M %f,%f" % (x, y)]
+        for j in xrange(n):
+            d.append("C %f,%f %f,%f %f,%f" % (
+                x + 5, y + rnd.uniform(-20, 20),
+                x + 15, y + rnd.uniform(-20, 20),
+                x + 20, y))
+            x += 20
+        paths.append(" ".join(d))
+    return [paths]
+
+def wings(n):
+    """Tapered and twisted wing section pair with n points per side"""
+    import render_nacafoil
+    naca = render_nacafoil.Naca()
+    naca.options, args = naca.OptionParser.parse_args([])
+    naca.options.points = n
+    layers = []
+    for number, size, twist in (("2412", 150.0, 0.0), ("0012", 100.0, 3.0)):
+        paths = []
+        for path in naca.renderFoil(number, size, twist):
+            paths.append("M " + " ".join(
+                    "%.3f %.3f" % (render_nacafoil.f*x, 500 - render_nacafoil.f*y)
+                    for x, y in path))
+        layers.append(paths)
+    return layers
+
+cases = {
+    "glyphs" : glyphs,
+    "splines" : splines,
+    "wings" : wings,
+}
+
+def document(layers):
+    """Build an svg document with one Inkscape layer per list of path data"""
+    root = inkex.etree.Element(inkex.addNS('svg', 'svg'))
+    for n, paths in enumerate(layers):
+        layer = inkex.etree.SubElement(root, inkex.addNS('g', 'svg'), {
+                inkex.addNS('groupmode', 'inkscape') : 'layer',
+                inkex.addNS('label', 'inkscape') : 'Layer %i' % n})
+        for d in paths:
+            inkex.etree.SubElement(layer, inkex.addNS('path', 'svg'), {'d' : d})
+    return root
+
+def run(job):
+    """Run the pipeline stages for one case and size, in its own process"""
+    case, size, flat = job
+    timings = {}
+
+    def timed(name, func, *args):
+        start = time.time()
+        result = func(*args)
+        timings[name] = timings.get(name, 0.0) + time.time() - start
+        return result
+
+    root = document(cases[case](size))
+    layers = root.getchildren()
+    sides = []
+    for layer in layers:
+        paths = timed("getPaths", hotwire.getPaths, layer, flat)
+        sides.append(timed("sortPaths", hotwire.sortPaths, paths))
+    path1 = path2 = sides[0]
+    if len(sides) > 1:
+        path2 = sides[1]
+        l = min(len(path1), len(path2))
+        path1, path2 = path1[:l], path2[:l]
+
+        def align():
+            for p1, p2 in zip(path1, path2):
+                hotwire.alignLinePaths(p1, p2)
+        timed("alignLinePaths", align)
+
+    def backToSVG():
+        for side, paths in enumerate((path1, path2)[:len(sides)]):
+            for nr, p in enumerate(paths):
+                p.setNr(nr)
+                p.backToSVG(side, hotwire.HotWire.style)
+    timed("backToSVG", backToSVG)
+
+    def gcode():
+        out = open(os.devnull, "w")
+        writer = GCodeWriter(out, 400.0)
+        writer.writePaths(hotwire.machinePaths(path1, path2))
+        writer.close()
+        out.close()
+        return writer
+    writer = timed("gcode", gcode)
+
+    return {
+        "case" : case,
+        "size" : size,
+        "paths" : len(path1),
+        "points" : sum(len(p) for p in path1),
+        "lines" : writer.lines,
+        "bytes" : writer.bytes,
+        "seconds" : timings,
+        "peak_rss_kb" : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-c", "--cases", action="store", type="string",
+                      dest="cases", default=",".join(sorted(cases)),
+                      help="Comma separated list of cases")
+    parser.add_option("-s", "--sizes", action="store", type="string",
+                      dest="sizes", default="100,1000,10000",
+                      help="Comma separated list of problem sizes")
+    parser.add_option("-f", "--flatness", action="store", type="float",
+                      dest="flat", default=0.1)
+    parser.add_option("-o", "--output", action="store", type="string",
+                      dest="output", default="benchmark.json",
+                      help="File for the results, - for stdout")
+    options, args = parser.parse_args(argv)
+
+    jobs = [(case, int(size), options.flat)
+            for case in options.cases.split(",")
+            for size in options.sizes.split(",")]
+    results = []
+    for job in jobs:
+        # a fresh process per run to get its own peak memory
+        pool = multiprocessing.Pool(1)
+        result = pool.apply(run, (job,))
+        pool.close()
+        pool.join()
+        sys.stderr.write("%(case)s %(size)i: %(points)i points, " % result +
+                         " ".join("%s %.3fs" % (k, v) for k, v in
+                                  sorted(result["seconds"].items())) +
+                         ", %i kB\n" % result["peak_rss_kb"])
+        results.append(result)
+
+    report = {
+        "python" : platform.python_version(),
+        "platform" : platform.platform(),
+        "time" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results" : results,
+        }
+    if options.output == "-":
+        json.dump(report, sys.stdout, indent=1)
+    else:
+        f = open(options.output, "w")
+        json.dump(report, f, indent=1)
+        f.close()
+
+if __name__ == '__main__':
+    main()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 encoding=utf-8 textwidth=99
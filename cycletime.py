@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+'''
+Copyright (C) 2012, Florian Festi
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+'''
+"""Estimate the run time of a four axis hot wire program
+
+Usage: cycletime.py [-m MSPEED] [-a ACCEL] [-d DEVIATION] FILE.ngc
+
+Every move is planned with a trapezoidal velocity profile. The speed is
+limited by the programmed feed, the maximal speed and acceleration of
+each axis, the centripetal acceleration on arcs and the speed allowed in
+the corners between moves (junction deviation as used by grbl). The feed
+applies to the XY distance of a move as long as XY moves and to the UV
+distance otherwise, as in LinuxCNC.
+"""
+import sys
+import re
+import math
+import json
+import heapq
+from optparse import OptionParser
+
+def _arcGeometry(last, move):
+    """Lengths, radii and directions of an arc move
+    :return:	(XY length, UV length, XY radius, UV radius,
+    		start direction, end direction) with the directions as
+    		(xy, uv) pairs of unit vectors
+    """
+    x0, y0, u0, v0 = last[:4]
+    x, y, u, v, i, j, cw = move[:7]
+    cx, cy = x0 + i, y0 + j
+    r = math.hypot(i, j)
+    a0 = math.atan2(y0 - cy, x0 - cx)
+    a1 = math.atan2(y - cy, x - cx)
+    if cw:
+        sweep = -((a0 - a1) % (2 * math.pi))
+    else:
+        sweep = (a1 - a0) % (2 * math.pi)
+    if sweep == 0.0:
+        sweep = cw and -2 * math.pi or 2 * math.pi
+    s = sweep > 0.0 and 1.0 or -1.0
+    lxy = r * abs(sweep)
+    t0 = (-s * math.sin(a0), s * math.cos(a0))
+    t1 = (-s * math.sin(a0 + sweep), s * math.cos(a0 + sweep))
+
+    # the UV side follows the same arc shifted by a constant offset
+    return lxy, lxy, r, r, (t0, t0), (t1, t1)
+
+def _moveTime(l, v0, v1, vmax, a):
+    """Time for a move of length l starting at v0 and ending at v1"""
+    da = (vmax*vmax - v0*v0) / (2.0 * a)
+    dd = (vmax*vmax - v1*v1) / (2.0 * a)
+    if da + dd <= l:
+        return (vmax - v0) / a + (vmax - v1) / a + (l - da - dd) / vmax
+    vp = math.sqrt((2.0 * a * l + v0*v0 + v1*v1) / 2.0)
+    return (max(vp - v0, 0.0) + max(vp - v1, 0.0)) / a
+
+class CycleTime(object):
+    """Result of estimate()
+
+    All times are in seconds. slowest is a list of
+    (seconds lost, move index, seconds, length, average speed, nominal
+    speed) sorted by the time lost against moving at the nominal speed.
+    The speeds are along the 4D move, the nominal speed is what the
+    programmed feed and the axis speed allow.
+    """
+
+    def __init__(self):
+        self.total = 0.0
+        self.cut = 0.0
+        self.travel = 0.0
+        self.moves = 0
+        self.length = 0.0
+        self.slowest = []
+
+    def report(self, labels=None):
+        """Return the result as text
+        :param labels:	optional list of names for the moves
+        """
+        lines = ["Estimated time: %s (cutting %s, travel %s), %i moves, %.0fmm" % (
+                formatTime(self.total), formatTime(self.cut),
+                formatTime(self.travel), self.moves, self.length)]
+        if self.slowest:
+            lines.append("Slowest moves:")
+        for lost, idx, t, l, speed, nominal in self.slowest:
+            name = labels and labels[idx] or "move %i" % idx
+            lines.append("  %s: %.2fs for %.2fmm, %.0f mm/min, nominal %.0f mm/min" % (
+                    name, t, l, speed * 60.0, nominal * 60.0))
+        return "\n".join(lines) + "\n"
+
+    def asDict(self):
+        return {
+            "total" : self.total,
+            "cut" : self.cut,
+            "travel" : self.travel,
+            "moves" : self.moves,
+            "length" : self.length,
+            "slowest" : [dict(zip(("lost", "move", "seconds", "length",
+                                   "speed", "nominal"), s))
+                         for s in self.slowest],
+            }
+
+def formatTime(seconds):
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return "%i:%02i:%02i" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+    return "%i:%02i" % (seconds // 60, seconds % 60)
+
+def estimate(moves, feeds, mspeed, accel=50.0, deviation=0.05,
+             travel=None, start=(0.0, 0.0, 0.0, 0.0), nslowest=5):
+    """Estimate the time needed for a list of moves
+    :param moves:	list of (x, y, u, v) line and
+    			(x, y, u, v, i, j, clockwise) arc moves in mm
+    :param feeds:	feed per move (mm/min), None for rapid moves
+    :param mspeed:	maximal speed of each axis (mm/min)
+    :param accel:	maximal acceleration of each axis (mm/s^2)
+    :param deviation:	junction deviation (mm) for the corner speed
+    :param travel:	optional list of booleans marking travel moves
+    :param start:	machine position before the first move
+    :param nslowest:	number of slowest moves to report
+    :return:		CycleTime
+    """
+    vaxis = mspeed / 60.0
+    sqrt = math.sqrt
+    hypot = math.hypot
+    inf = float("inf")
+
+    # per move: index, 4D length, programmed speed within the axis limits,
+    # max speed, acceleration
+    idxs = []
+    lengths = []
+    nominal = []
+    vmaxs = []
+    accels = []
+    # max speed at the start of each move from the corner before it
+    corners = []
+    last = start
+    lastdir = None
+    for n, move in enumerate(moves):
+        dx, dy = move[0] - last[0], move[1] - last[1]
+        du, dv = move[2] - last[2], move[3] - last[3]
+        vmax = inf
+        if len(move) > 4:
+            lxy, luv, rxy, ruv, d0, d1 = _arcGeometry(last, move)
+            l = hypot(lxy, luv)
+            if l == 0.0:
+                continue
+            # centripetal acceleration of both sides
+            if rxy > 0.0 and lxy > 0.0:
+                vmax = sqrt(accel * rxy) * l / lxy
+            if ruv > 0.0 and luv > 0.0:
+                vmax = min(vmax, sqrt(accel * ruv) * l / luv)
+            fxy, fuv = lxy / l, luv / l
+            d0 = (d0[0][0]*fxy, d0[0][1]*fxy, d0[1][0]*fuv, d0[1][1]*fuv)
+            d1 = (d1[0][0]*fxy, d1[0][1]*fxy, d1[1][0]*fuv, d1[1][1]*fuv)
+            share = max(fxy, fuv)
+        else:
+            lxy, luv = hypot(dx, dy), hypot(du, dv)
+            l = hypot(lxy, luv)
+            if l == 0.0:
+                continue
+            d0 = d1 = (dx / l, dy / l, du / l, dv / l)
+            share = max(abs(d0[0]), abs(d0[1]), abs(d0[2]), abs(d0[3]))
+        last = move
+
+        # the feed applies to XY if XY moves
+        feed = feeds[n]
+        if feed is None:
+            vnom = inf
+        else:
+            vnom = feed / 60.0 * l / (lxy > 1e-9 and lxy or luv)
+        vmax = min(vmax, vnom, vaxis / share)
+        a = accel / share
+
+        corner = 0.0
+        if lastdir is not None:
+            cos = -(lastdir[0]*d0[0] + lastdir[1]*d0[1] +
+                    lastdir[2]*d0[2] + lastdir[3]*d0[3])
+            if cos < -0.999999:
+                corner = inf
+            elif cos < 0.999999:
+                sinhalf = sqrt(0.5 * (1.0 - cos))
+                corner = sqrt(min(a, accels[-1]) * deviation *
+                              sinhalf / (1.0 - sinhalf))
+            corner = min(corner, vmax, vmaxs[-1])
+        lastdir = d1
+
+        idxs.append(n)
+        lengths.append(l)
+        nominal.append(min(vnom, vaxis / share))
+        vmaxs.append(vmax)
+        accels.append(a)
+        corners.append(corner)
+
+    # limit the corner speeds to what can be reached from both sides
+    m = len(idxs)
+    speeds = corners + [0.0]
+    for k in xrange(m - 1, -1, -1):
+        v = sqrt(speeds[k+1]*speeds[k+1] + 2.0 * accels[k] * lengths[k])
+        if v < speeds[k]:
+            speeds[k] = v
+    for k in xrange(m):
+        v = sqrt(speeds[k]*speeds[k] + 2.0 * accels[k] * lengths[k])
+        if v < speeds[k+1]:
+            speeds[k+1] = v
+
+    result = CycleTime()
+    result.moves = m
+    slowest = []
+    for k in xrange(m):
+        l = lengths[k]
+        t = _moveTime(l, speeds[k], speeds[k+1], vmaxs[k], accels[k])
+        n = idxs[k]
+        if travel is not None and travel[n]:
+            result.travel += t
+        else:
+            result.cut += t
+        result.length += l
+        lost = t - l / nominal[k]
+        if nslowest and lost > 0.0:
+            entry = (lost, n, t, l, l / t, nominal[k])
+            if len(slowest) < nslowest:
+                heapq.heappush(slowest, entry)
+            elif lost > slowest[0][0]:
+                heapq.heapreplace(slowest, entry)
+    result.total = result.cut + result.travel
+    result.slowest = sorted(slowest, reverse=True)
+    return result
+
+def estimatePaths(paths, feed, mspeed, feeds=None, **kw):
+    """Estimate the time of a program written by GCodeWriter.writePaths()
+
+    The writer has no rapid moves, the wire cuts at the feed on the way
+    into each path, too. So, as readProgram() does for the written file,
+    nothing is counted as travel.
+    :param paths:	list of lists of moves
+    :param feed:	feed of the program (mm/min)
+    :param feeds:	optional list of feed lists matching paths
+    :return:		CycleTime
+    """
+    moves = []
+    allfeeds = []
+    for n, path in enumerate(paths):
+        moves.extend(path)
+        if feeds is None:
+            allfeeds.extend([feed] * len(path))
+        else:
+            allfeeds.extend(feeds[n])
+    return estimate(moves, allfeeds, mspeed, **kw)
+
+_words = re.compile(r"([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+
+def readProgram(f, axes="XYUV"):
+    """Read the moves of a G-code file
+
+    Understands G00 to G03 with I and J relative to the start point, F,
+    G20/G21 and comments. G00 moves are counted as travel.
+    :param f:		file like object
+    :param axes:	letters used for the four axes
+    :return:		moves, feeds, travel flags, line numbers
+    """
+    moves = []
+    feeds = []
+    travel = []
+    lines = []
+    pos = [0.0, 0.0, 0.0, 0.0]
+    motion = None
+    feed = None
+    scale = 1.0
+    for nr, line in enumerate(f):
+        line = re.sub(r"\(.*?\)|;.*", "", line.upper())
+        words = _words.findall(line)
+        if not words:
+            continue
+        target = list(pos)
+        ij = [0.0, 0.0]
+        moved = False
+        for letter, value in words:
+            value = float(value)
+            if letter == "G":
+                if value in (0, 1, 2, 3):
+                    motion = int(value)
+                elif value == 20:
+                    scale = 25.4
+                elif value == 21:
+                    scale = 1.0
+            elif letter == "F":
+                feed = value * scale
+            elif letter in axes:
+                target[axes.index(letter)] = value * scale
+                moved = True
+            elif letter in "IJ":
+                ij["IJ".index(letter)] = value * scale
+                moved = True
+        if not moved or motion is None:
+            continue
+        if motion in (2, 3):
+            moves.append(tuple(target) + (ij[0], ij[1], motion == 2))
+        else:
+            moves.append(tuple(target))
+        feeds.append(motion == 0 and None or feed)
+        travel.append(motion == 0)
+        lines.append(nr + 1)
+        pos = target
+    return moves, feeds, travel, lines
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage="%prog [options] FILE.ngc")
+    parser.add_option("-m", "--mspeed", action="store", type="float",
+                      dest="mspeed", default=400.0,
+                      help="Max. speed of each axis (mm/min)")
+    parser.add_option("-a", "--accel", action="store", type="float",
+                      dest="accel", default=50.0,
+                      help="Max. acceleration of each axis (mm/s^2)")
+    parser.add_option("-d", "--deviation", action="store", type="float",
+                      dest="deviation", default=0.05,
+                      help="Junction deviation for the corner speed (mm)")
+    parser.add_option("--axes", action="store", type="string",
+                      dest="axes", default="XYUV",
+                      help="Names of the four machine axes")
+    parser.add_option("-n", "--slowest", action="store", type="int",
+                      dest="slowest", default=5,
+                      help="Number of slowest moves to list")
+    parser.add_option("-j", "--json", action="store_true",
+                      dest="json", default=False,
+                      help="Print the result as JSON")
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("Expected one G-code file")
+
+    if args[0] == "-":
+        f = sys.stdin
+    else:
+        f = open(args[0])
+    moves, feeds, travel, lines = readProgram(f, options.axes)
+    result = estimate(moves, feeds, options.mspeed, options.accel,
+                      options.deviation, travel, nslowest=options.slowest)
+    if options.json:
+        json.dump(result.asDict(), sys.stdout, indent=1)
+        sys.stdout.write("\n")
+    else:
+        sys.stdout.write(result.report(["line %i" % l for l in lines]))
+
+if __name__ == '__main__':
+    main()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 encoding=utf-8 textwidth=99
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+'''
+Copyright (C) 2012, Florian Festi
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+'''
+"""Stream G-code to a controller on a serial port or pseudo terminal
+
+Usage: gcodestream.py -d DEVICE [-b BAUDRATE] [-r RXBUFFER] FILES...
+
+Uses character counting flow control: lines are sent as long as the
+bytes of all lines not yet answered with "ok" or "error" fit into the
+receive buffer of the controller (128 bytes for grbl).
+"""
+import sys
+import os
+import time
+import select
+import termios
+import tty
+from collections import deque
+from optparse import OptionParser
+
+class StreamError(Exception):
+    pass
+
+def _setupTTY(fd, baudrate):
+    """Switch fd to raw mode with the given baud rate, if it is a tty"""
+    try:
+        termios.tcgetattr(fd)
+    except termios.error:
+        return
+    speed = getattr(termios, "B%i" % baudrate, None)
+    if speed is None:
+        raise ValueError("Unsupported baud rate %i" % baudrate)
+    tty.setraw(fd)
+    attrs = termios.tcgetattr(fd)
+    attrs[4] = attrs[5] = speed
+    termios.tcsetattr(fd, termios.TCSANOW, attrs)
+
+def cleanLine(line):
+    """Remove comments and white space that the controller does not need"""
+    while "(" in line:
+        start = line.index("(")
+        end = line.find(")", start)
+        if end < 0:
+            line = line[:start]
+        else:
+            line = line[:start] + line[end+1:]
+    line = line.split(";", 1)[0]
+    line = "".join(line.split())
+    if line == "%":
+        return ""
+    return line
+
+class Streamer(object):
+    """File like object sending the lines written to it to a controller
+
+    write() returns as soon as all complete lines are sent, close() waits
+    until all of them are answered.
+    """
+
+    def __init__(self, device, baudrate=115200, rxbuffer=128, strip=True,
+                 timeout=None, stoponerror=True):
+        """
+        :param device:		device name or open file descriptor
+        :param baudrate:	baud rate for serial ports
+        :param rxbuffer:	size of the receive buffer of the controller
+        :param strip:		remove comments, white space and blank lines
+        :param timeout:		max. seconds to wait for an answer, None
+        			for no limit
+        :param stoponerror:	raise StreamError on "error" answers
+        """
+        if isinstance(device, int):
+            self.fd = device
+            self.close_fd = False
+        else:
+            self.fd = os.open(device, os.O_RDWR | os.O_NOCTTY)
+            self.close_fd = True
+            _setupTTY(self.fd, baudrate)
+        self.rxbuffer = rxbuffer
+        self.strip = strip
+        self.timeout = timeout
+        self.stoponerror = stoponerror
+
+        self.partial = ""
+        self.received = ""
+        self.pending = deque()
+        self.inflight = deque()
+        self.used = 0
+        self.closing = False
+
+        self.lines = 0
+        self.bytes = 0
+        self.acks = 0
+        self.errors = []
+        self.messages = []
+        self.underruns = 0
+        self.waiting = 0.0
+        self.fill = 0
+        self.start = None
+        self.end = None
+
+    def write(self, data):
+        lines = (self.partial + data).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            if self.strip:
+                line = cleanLine(line)
+                if not line:
+                    continue
+            line = line.rstrip("\r")
+            if len(line) + 1 > self.rxbuffer:
+                raise StreamError("Line longer than receive buffer: %r" % line)
+            self.pending.append(line + "\n")
+        self._send()
+
+    def flush(self):
+        self._send()
+
+    def close(self):
+        """Send the remaining lines and wait for all answers"""
+        if self.partial:
+            self.write("\n")
+        self._send()
+        self.closing = True
+        while self.inflight:
+            self._receive(self.timeout)
+        self.end = time.time()
+        if self.close_fd:
+            os.close(self.fd)
+            self.close_fd = False
+
+    def abort(self):
+        """Stop without waiting for answers, e.g. after a StreamError"""
+        self.pending.clear()
+        self.end = time.time()
+        if self.close_fd:
+            os.close(self.fd)
+            self.close_fd = False
+
+    def _send(self):
+        while self.pending:
+            # read answers already there, then wait only if the buffer is full
+            self._receive(0)
+            if self.used + len(self.pending[0]) > self.rxbuffer:
+                start = time.time()
+                while self.used + len(self.pending[0]) > self.rxbuffer:
+                    self._receive(self.timeout)
+                self.waiting += time.time() - start
+            line = self.pending.popleft()
+            if self.start is None:
+                self.start = time.time()
+            data = line
+            while data:
+                n = os.write(self.fd, data)
+                data = data[n:]
+            self.inflight.append(line)
+            self.used += len(line)
+            self.fill += self.used
+            self.lines += 1
+            self.bytes += len(line)
+
+    def _receive(self, timeout):
+        """Read and handle the answers of the controller"""
+        r, w, x = select.select([self.fd], [], [], timeout)
+        if not r:
+            if timeout:
+                raise StreamError("No answer from controller for %.1fs" % timeout)
+            return
+        data = os.read(self.fd, 4096)
+        if not data:
+            raise StreamError("Controller closed the connection")
+        lines = (self.received + data).split("\n")
+        self.received = lines.pop()
+        for answer in lines:
+            answer = answer.strip()
+            if answer == "ok" or answer.startswith("error"):
+                if not self.inflight:
+                    self.messages.append(answer)
+                    continue
+                line = self.inflight.popleft()
+                self.used -= len(line)
+                self.acks += 1
+                if answer != "ok":
+                    self.errors.append((self.acks, line.strip(), answer))
+                    if self.stoponerror:
+                        raise StreamError("Line %i %r: %s" % (
+                                self.acks, line.strip(), answer))
+                if not self.inflight and (self.pending or not self.closing):
+                    # controller has nothing left in its buffer
+                    self.underruns += 1
+            elif answer.startswith("ALARM"):
+                raise StreamError(answer)
+            elif answer:
+                self.messages.append(answer)
+
+    def stats(self):
+        """Return dict with throughput and buffer statistics"""
+        seconds = (self.end or time.time()) - (self.start or time.time())
+        return {
+            "lines" : self.lines,
+            "bytes" : self.bytes,
+            "seconds" : seconds,
+            "lines_per_second" : seconds and self.lines / seconds or 0.0,
+            "bytes_per_second" : seconds and self.bytes / seconds or 0.0,
+            "underruns" : self.underruns,
+            "waiting_seconds" : self.waiting,
+            "average_fill" : self.lines and
+                float(self.fill) / self.lines / self.rxbuffer or 0.0,
+            "errors" : len(self.errors),
+            }
+
+    def report(self):
+        stats = self.stats()
+        stats["average_fill"] *= 100.0
+        return ("Sent %(lines)i lines, %(bytes)i bytes in %(seconds).1fs "
+                "(%(lines_per_second).1f lines/s, %(bytes_per_second).0f bytes/s)\n"
+                "Buffer: %(underruns)i underruns, %(waiting_seconds).1fs full, "
+                "%(average_fill).0f%% average fill, %(errors)i errors\n" % stats)
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage="%prog -d DEVICE [options] FILES...")
+    parser.add_option("-d", "--device", action="store", type="string",
+                      dest="device", help="Serial port or pseudo terminal")
+    parser.add_option("-b", "--baudrate", action="store", type="int",
+                      dest="baudrate", default=115200)
+    parser.add_option("-r", "--rxbuffer", action="store", type="int",
+                      dest="rxbuffer", default=128,
+                      help="Size of the receive buffer of the controller")
+    parser.add_option("-k", "--keep", action="store_false",
+                      dest="strip", default=True,
+                      help="Send comments and white space, too")
+    parser.add_option("-t", "--timeout", action="store", type="float",
+                      dest="timeout", default=None,
+                      help="Max. seconds to wait for an answer")
+    options, args = parser.parse_args(argv)
+    if not options.device:
+        parser.error("No device given")
+    if not args:
+        parser.error("No G-code files given")
+
+    streamer = Streamer(options.device, options.baudrate, options.rxbuffer,
+                        options.strip, options.timeout)
+    try:
+        for name in args:
+            f = open(name)
+            for line in f:
+                streamer.write(line)
+            f.close()
+        streamer.close()
+    except StreamError, e:
+        streamer.abort()
+        sys.stderr.write("%s\n" % e)
+        sys.stderr.write(streamer.report())
+        return 1
+    sys.stderr.write(streamer.report())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 encoding=utf-8 textwidth=99
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+'''
+Copyright (C) 2012, Florian Festi
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+'''
+import sys
+
+def lineFormatter(axes="XYUV", precision=2, command="G01"):
+    """Return a formatter for linear moves
+    :param axes:	letters used for the four axes
+    :param precision:	number of decimals
+    :return:		function taking a list of 4-tuples, returning a string
+    """
+    line = command + "".join(" %s%%%i.%if" % (a, precision+5, precision)
+                             for a in axes) + "\n"
+
+    def formatter(points):
+        flat = []
+        for pt in points:
+            flat.extend(pt)
+        return (line * len(points)) % tuple(flat)
+    return formatter
+
+def arcFormatter(axes="XYUV", precision=2):
+    """Return a formatter for arc moves
+
+    I and J give the center of the XY arc. The controller has to move U and
+    V along the same arc, shifted by the U/V offset of the start point.
+    :param axes:	letters used for the four axes
+    :param precision:	number of decimals
+    :return:		function taking a list of (x, y, u, v, i, j, clockwise)
+    			tuples, returning a string
+    """
+    fmt = "".join(" %s%%%i.%if" % (a, precision+5, precision)
+                  for a in axes + "IJ") + "\n"
+
+    def formatter(arcs):
+        return "".join((arc[6] and "G02" or "G03") + fmt % arc[:6]
+                       for arc in arcs)
+    return formatter
+
+class GCodeWriter(object):
+    """Buffered G-code output
+
+    Paths are formatted in batches and collected in a buffer that is only
+    flushed when it gets larger than bufsize.
+    """
+
+    header = """%%
+G21 (use mm)
+F%.0f (Speed)
+"""
+    footer = """
+M30 (End Program)
+%
+"""
+
+    def __init__(self, out, feed, correction="G40", formatter=None,
+                 arcformatter=None, bufsize=1<<20, batch=1024):
+        """
+        :param out:		file name, "-" for stdout or a file like object
+        :param feed:		feed rate for the whole program
+        :param correction:	cutter correction, e.g. "G40" or "G41 D1.00"
+        :param formatter:	function turning a list of points into G-code
+        :param arcformatter:	same for a list of arcs
+        :param bufsize:		number of bytes to collect before writing
+        :param batch:		number of points formatted at once
+        """
+        if out == "-":
+            self.f = sys.stdout
+            self.close_f = False
+        elif isinstance(out, basestring):
+            self.f = open(out, "w")
+            self.close_f = True
+        else:
+            self.f = out
+            self.close_f = False
+        self.formatter = formatter or lineFormatter()
+        self.arcformatter = arcformatter or arcFormatter()
+        self.bufsize = bufsize
+        self.batch = batch
+        self.buf = []
+        self.buflen = 0
+        self.lines = 0
+        self.bytes = 0
+        self.feed = feed
+
+        self.write(self.header % feed)
+        self.write(correction)
+        self.write("\n\n")
+
+    def write(self, text):
+        self.buf.append(text)
+        self.buflen += len(text)
+        if self.buflen >= self.bufsize:
+            self.flush()
+
+    def flush(self):
+        data = "".join(self.buf)
+        self.f.write(data)
+        self.bytes += len(data)
+        self.buf = []
+        self.buflen = 0
+
+    def writePath(self, points, feeds=None):
+        """Write moves to a list of (x, y, u, v) points and
+        (x, y, u, v, i, j, clockwise) arcs
+        :param feeds:	optional list of feed rates, one per point
+        """
+        if feeds is None:
+            self._writeMoves(points)
+            return
+        i = 0
+        n = len(points)
+        while i < n:
+            feed = feeds[i]
+            j = i + 1
+            while j < n and feeds[j] == feed:
+                j += 1
+            if feed != self.feed:
+                # the F word goes on the first move of the new feed
+                if len(points[i]) == 4:
+                    text = self.formatter(points[i:i+1])
+                else:
+                    text = self.arcformatter(points[i:i+1])
+                self.write("%s F%.0f\n" % (text[:-1], feed))
+                self.feed = feed
+                self.lines += 1
+                i += 1
+            self._writeMoves(points[i:j])
+            i = j
+
+    def _writeMoves(self, points):
+        i = 0
+        n = len(points)
+        while i < n:
+            # split into runs of lines and arcs of at most batch moves
+            kind = len(points[i])
+            j = i + 1
+            end = min(n, i + self.batch)
+            while j < end and len(points[j]) == kind:
+                j += 1
+            if kind == 4:
+                self.write(self.formatter(points[i:j]))
+            else:
+                self.write(self.arcformatter(points[i:j]))
+            self.lines += j - i
+            i = j
+
+    def writePaths(self, paths, feeds=None):
+        """Write all paths from an iterable of point lists
+        :param feeds:	optional list of feed lists matching paths
+        """
+        if feeds is None:
+            for points in paths:
+                self.writePath(points)
+        else:
+            for points, f in zip(paths, feeds):
+                self.writePath(points, f)
+
+    def close(self):
+        self.write(self.footer)
+        self.flush()
+        if self.close_f:
+            self.f.close()
+        else:
+            self.f.flush()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 encoding=utf-8 textwidth=99
@@ -19,275 +19,26 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 import sys
 sys.path.append("/usr/share/inkscape/extensions")
 import os
+import time
+from array import array
+
+import inkex
+
+# the geometry lives in hotwirecore, re-exported for scripts using hotwire
+from hotwirecore import distances, intermediatePoint, arcLengths, \
+    resamplePath, alignLinePaths, sortPaths, mergePaths, pointDistance, \
+    KDTree, optimizeOrder, orderPaths, connectedRuns, pathDescriptor, \
+    matchPaths, getPaths, flattenCubic, flattenPath, getLayerPaths, \
+    alignPaths, Profile, NoProfile, FlatCache, segmentKey, chainKeys, \
+    SegmentCache, Path
+from gcodewriter import GCodeWriter, lineFormatter, arcFormatter
+from toolpath import projectToOuterPlane, machinePaths, projectPaths, \
+    removeLoops, offsetPath, offsetPaths, simplifyPath, fitArcs, planFeeds, \
+    machineMoves, writeToolpath
 
-import inkex, simplestyle, simpletransform
-import cubicsuperpath, bezmisc, cspsubdiv
-
-from pprint import pprint
-
-def distances(points):
-    """Calculate the distances for a list of points
-    :param points:	iterable of float pairs
-    :return:		list of distance
-    """
-    if not points:
-        return [0]
-    lastpt = points[0]
-    dists = []
-    for pt in points[1:]:
-        dists.append(bezmisc.pointdistance(lastpt, pt))
-        lastpt = pt
-    return dists
-
-def intermediatePoint(pt1, pt2, relDist=0.5):
-    q = relDist
-    r = 1 - relDist 
-    return (pt1[0]*r + pt2[0]*q, pt1[1]*r + pt2[1]*q)
-
-def alignLinePaths(points1, points2):
-    """Takes two arrays of (x, y) points
-       returns two arrays of points with the same number of points"""
-
-    dists1 = distances(points1)
-    dists1.append(0.0)
-    lenght1 = sum(dists1)
-    dists2 = distances(points2)
-    dists2.append(0.0)
-    lenght2 = sum(dists2)
-    f = lenght1/lenght2 # XXX factor that points2 moves faster that points1
-
-    new1 = [points1[0]]
-    new2 = [points2[0]]
-    idx1 = 1
-    idx2 = 1
-    l1 = 0.0
-    l2 = 0.0
-    ln1 = dists1[0]
-    ln2 = f * dists2[0]
-    while idx1 < (len(points1)) and idx2 < (len(points2)):
-        if abs(ln1-ln2) < 0.5: # both point match
-            # Add Point1
-            l1 = ln1
-            new1.append(points1[idx1])
-            ln1 = l1 + dists1[idx1]
-            idx1 += 1
-            # Add Point2
-            l2 = ln2
-            new2.append(points2[idx2])
-            ln2 = l2 + f * dists2[idx2]
-            idx2 += 1
-        elif ln1 < ln2:            
-            # Add Point1
-            l1 = ln1
-            new1.append(points1[idx1])
-            ln1 = l1 + dists1[idx1]
-            idx1 += 1
-
-            # add intermediate point to 2
-            reldist = (l1-l2)/(ln2-l2)
-            new2.append(intermediatePoint(new2[-1], points2[idx2], reldist))
-            l2 = l1
-        else:
-            # Add Point2
-            l2 = ln2
-            new2.append(points2[idx2])
-            ln2 = l2 + f * dists2[idx2]
-            idx2 += 1
-
-            # add intermediate point to 1
-            reldist = (l2-l1)/(ln1-l1)
-            new1.append(intermediatePoint(new1[-1], points1[idx1], reldist))
-            l1 = l2
-    # check for remaining points
-    if idx1 < len(points1) or idx2 < len(points2):
-        new1.append(points1[-1])
-        new2.append(points2[-1])
-
-    points1[:] = new1
-    points2[:] = new2
-
-def _removePath(d, p):
-    d[p[0]].remove(p)
-    if not d[p[0]]:
-        del d[p[0]]
-    d[p[-1]].remove(p)
-    if not d[p[-1]]:
-        del d[p[-1]]
-
-
-def _cmpStartPts(pt1, pt2, ends):
-    l1 = len(ends[pt1])
-    l2 = len(ends[pt2])
-
-    # Prefere uneven connection count
-    if (l1 % 2) and not (l2 % 2):
-        return 1
-    if not (l1 %2) and (l2 % 2):
-        return -1
-    # Prefere starts
-    s_cnt1 = reduce(lambda x, y: x+int(y[0] is pt1), ends[pt1], 0)
-    s_cnt2 = reduce(lambda x, y: x+int(y[0] is pt2), ends[pt2], 0)
-    s_cnt1 = min(s_cnt1, 1)
-    s_cnt2 = min(s_cnt2, 1)
-
-    if s_cnt1 != s_cnt2:
-        return cmp(s_cnt1, s_cnt2)
-
-    # Prefere less connections
-    return cmp(l1, l2)
-
-def sortPaths(paths):
-    #pprint(paths, sys.stderr)
-    if not paths:
-        return []
-    if len(paths) == 1:
-        return [paths[0]]
-
-    # make sure same points are really identical
-    tmp = [(p[0], 0, p) for p in paths] + \
-        [(p[-1], -1, p) for p in paths]
-
-    for i in xrange(len(tmp)):
-        for j in xrange(i+1, len(tmp)):
-            if (abs(tmp[i][0][0]-tmp[j][0][0]) < 0.001 and
-                abs(tmp[i][0][1]-tmp[j][0][1]) < 0.001):
-                tmp[j][2][tmp[j][1]] = tmp[i][0]
-
-    del tmp
-
-    # build ends hash: endpoint -> [paths]
-    ends = {}
-    for p in paths:
-        if len(p) == 1:
-            continue
-        if len(p) == 2 and p[0] == p[1]:
-            continue
-
-        ends.setdefault(p[0], []).append(p)
-        ends.setdefault(p[-1], []).append(p)
-
-    # look for a good starting point
-    startpt = ends.iterkeys().next()
-    pos = 0
-    for end in ends.iterkeys():
-        if _cmpStartPts(end, startpt, ends) > 0:
-            startpt = end
-
-    newpaths = []
-    for path in ends[startpt]:
-        if path[0] == startpt:
-            newpaths = [path]
-            break
-    else: # no start point
-        newpaths = [ ends[startpt][0] ]
-        newpaths[0].reverse()
-    _removePath(ends, newpaths[0])
-
-    while ends:
-        if not newpaths[pos][-1] in ends:
-            ### look for new loop
-            for n, p in enumerate(newpaths):
-                if p[-1] in ends:
-                    pos = n
-                    break
-            else:
-                # error, no continuous path found
-                break
-        p2 = ends[newpaths[pos][-1]][0]
-        if p2[-1] == newpaths[pos][-1]:
-            p2.reverse()
-        pos += 1
-        newpaths.insert(pos, p2)
-        _removePath(ends, p2)
-
-    #pprint(newpaths, sys.stderr)
-    return newpaths
-
-def mergePaths(paths):
-    result = paths[0]
-    for p in paths[1:]:
-        result.extend(p[1:])
-    return result
-
-def getPaths(layer,flat=1.0):
-    "return list of lists of float pairs"
-    paths = []
-    for item in layer.getchildren():
-        if item.tag == inkex.addNS('g', 'svg'):
-            transform = simpletransform.parseTransform(item.get('transform'))
-            for i in item.getchildren():
-                if i.tag == inkex.addNS('path','svg'):
-                    paths.append(Path(i, flat, transform))
-
-        if item.tag == inkex.addNS('path','svg'):
-            paths.append(Path(item, flat))
-    return paths
-
-def projectToOuterPlane(z_xy, p_xy, z_uv, p_uv, width):
-    """front cutting plane at z==0
-       back cutting plane at z==width"""
-    x, y = p_xy
-    u, v = p_uv
-    d1 = float(z_xy)
-    d2 = float(z_uv - z_xy)
-    d3 = float(width - p_uv)
-    p_xy = [ x + d1*(x-u)/d2, y + d1*(y-v)/d2 ]
-    p_uv = [ u + d3*(u-x)/d2, V + d3*(v-y)/d2 ]
-
-    return p_xy, p_uv
-
-class Path(list):
-
-    rainbow = [
-        0xFE0000, # red
-        0xFE7E00, # orange
-        0xFEFE00, # yellow
-        0x00FE00, # green
-        0x0000FE, # blue
-        0x6600FE, # indigo
-        0x8A00FE, # violet
-        ]
-
-    def __init__(self, tag, flatness, transform=[[1.0,0.0,0.0],[0.0,1.0,0.0]]):
-        self.tag = tag
-        self._readPath(tag, flatness, transform)
-        self.nr = 0
-
-    def _readPath(self, item, flat, transform):
-        p = cubicsuperpath.parsePath(item.get('d'))
-        cspsubdiv.cspsubdiv(p, flat)
-        subpaths = []
-        for sp in p:
-            sps = []
-            subpaths.append(sps)
-            for c0, c1, c2 in sp:
-                pt = list(c2)
-                simpletransform.applyTransformToPoint(transform, pt)
-                sps.append(tuple(pt))
- 
-        self[:] = mergePaths(sortPaths(subpaths))
-
-    def setNr(self, nr):
-        self.nr = nr
-
-    def backToSVG(self, side, style):
-        # write back geometry
-        d = ["M"]
-        for pt in self:
-            d.append("%.3f %.3f" % pt)
-        self.tag.set("d", " ".join(d))
-        # set style and color
-        value = self.rainbow[self.nr % 7] >> side
-
-        style = style.copy()
-        style["stroke"] = "#%06X" % value
-        sys.stderr.write("%s %i\n" % (style["stroke"], side))
-        self.tag.set("style", simplestyle.formatStyle(style))
-
-        p = self.tag.getparent()
-        if "transform" in p.attrib:
-            del p.attrib["transform"]
 
+class HotWireError(Exception):
+    pass
 
 class HotWire(inkex.Effect):
 
@@ -334,16 +85,96 @@ class HotWire(inkex.Effect):
                         action="store", type="float", 
                         dest="flat", default='1.0',
                         help="How strong are bends allowed when converting splines to lines")
+        self.OptionParser.add_option("--flatcache", action="store",
+                                     type="inkbool",
+                                     dest="flatcache", default=True,
+                                     help="Cache flattened paths")
+        self.OptionParser.add_option("--cachedir", action="store",
+                                     type="string",
+                                     dest="cachedir", default="~/.cache/hotwire",
+                                     help="Directory for cached paths, empty for memory only")
+        self.OptionParser.add_option("--cachesize", action="store",
+                                     type="float",
+                                     dest="cachesize", default=64.0,
+                                     help="Maximal size of the cache directory (MB)")
         self.OptionParser.add_option("--cspeed", action="store", type="float",
                                      dest="cspeed", default=400.0)
         self.OptionParser.add_option("--mspeed", action="store", type="float",
                                      dest="mspeed", default=400.0)
 
+        self.OptionParser.add_option("--estimate", action="store",
+                                     type="inkbool",
+                                     dest="estimate", default=False,
+                                     help="Estimate the run time of the program")
+        self.OptionParser.add_option("--accel", action="store", type="float",
+                                     dest="accel", default=50.0,
+                                     help="Max. acceleration of each axis (mm/s^2)")
+        self.OptionParser.add_option("--deviation", action="store", type="float",
+                                     dest="deviation", default=0.05,
+                                     help="Junction deviation for the corner speed (mm)")
+
+        self.OptionParser.add_option("--jobs", action="store", type="int",
+                                     dest="jobs", default=1,
+                                     help="Number of processes for flattening and aligning (0: one per CPU)")
+
+        self.OptionParser.add_option("--optimize", action="store",
+                                     type="inkbool",
+                                     dest="optimize", default=False,
+                                     help="Reorder paths to minimize moves between them")
+
+        self.OptionParser.add_option("--matchdistance", action="store",
+                                     type="float",
+                                     dest="matchdistance", default=0.25,
+                                     help="Max. difference of paths on both sides to be cut together, relative to the size of the layer")
+        self.OptionParser.add_option("--aligntolerance", action="store",
+                                     type="float",
+                                     dest="aligntolerance", default=0.15,
+                                     help="Distance (mm) for points of both sides to be matched")
+        self.OptionParser.add_option("--alignpoints", action="store",
+                                     type="int",
+                                     dest="alignpoints", default=0,
+                                     help="Resample both sides to this number of points (0: off)")
+
+        self.OptionParser.add_option("--simplify", action="store",
+                                     type="float",
+                                     dest="simplify", default=0.0,
+                                     help="Remove points closer than this to a straight line (mm, 0: off)")
+
+        self.OptionParser.add_option("--arcs", action="store",
+                                     type="inkbool",
+                                     dest="arcs", default=False,
+                                     help="Replace runs of short lines by G02/G03 arcs")
+        self.OptionParser.add_option("--arctolerance", action="store",
+                                     type="float",
+                                     dest="arctolerance", default=0.01,
+                                     help="Maximal deviation of fitted arcs (mm)")
+        self.OptionParser.add_option("--uvarcs", action="store",
+                                     type="inkbool",
+                                     dest="uvarcs", default=False,
+                                     help="Controller moves U/V along the G02/G03 arc of X/Y")
+
+        self.OptionParser.add_option("--feedplanning", action="store",
+                                     type="inkbool",
+                                     dest="feedplanning", default=False,
+                                     help="Adjust feed per move for two sided cuts")
+        self.OptionParser.add_option("--feedstep", action="store",
+                                     type="float",
+                                     dest="feedstep", default=5.0,
+                                     help="Distance of the feed levels (%)")
+
         self.OptionParser.add_option("--ccorrection", action="store",
                                      type="int",
                                      dest="ccorrection", default=0)
         self.OptionParser.add_option("--cdiam", action="store", type="float",
                                      dest="cdiam", default=1.0)
+        self.OptionParser.add_option("--softkerf", action="store",
+                                     type="inkbool",
+                                     dest="softkerf", default=False,
+                                     help="Offset the paths instead of using G41/G42")
+
+        self.OptionParser.add_option("--axes", action="store", type="string",
+                                     dest="axes", default="XYUV",
+                                     help="Names of the four machine axes")
 
         self.OptionParser.add_option("-d", "--directory",
                                      action="store", type="string",
@@ -357,6 +188,39 @@ class HotWire(inkex.Effect):
                                      action="store", type="inkbool",
                                      dest="add_numeric_suffix_to_filename",
                                      default=True,help="Add numeric suffix to filename")		
+        self.OptionParser.add_option("--incremental", action="store",
+                                     type="inkbool",
+                                     dest="incremental", default=False,
+                                     help="Reuse the moves of unchanged paths from the last export")
+
+        self.OptionParser.add_option("--toolpath", action="store",
+                                     type="string",
+                                     dest="toolpath", default="",
+                                     help="Also save the aligned toolpath to this file for toolpath.py")
+        self.OptionParser.add_option("--device", action="store",
+                                     type="string",
+                                     dest="device", default="",
+                                     help="Send the G-code to the controller on this serial port instead of writing a file")
+        self.OptionParser.add_option("--baudrate", action="store",
+                                     type="int",
+                                     dest="baudrate", default=115200)
+        self.OptionParser.add_option("--rxbuffer", action="store",
+                                     type="int",
+                                     dest="rxbuffer", default=128,
+                                     help="Size of the receive buffer of the controller")
+
+        self.OptionParser.add_option("--profile", action="store",
+                                     type="inkbool",
+                                     dest="profile", default=False,
+                                     help="Report time and counters per stage as JSON")
+        self.OptionParser.add_option("--profilefile", action="store",
+                                     type="string",
+                                     dest="profilefile", default="",
+                                     help="File for the profile report, default stderr")
+        self.OptionParser.add_option("--profilestage", action="store",
+                                     type="string",
+                                     dest="profilestage", default="",
+                                     help="Run this stage under cProfile")
 
         self.OptionParser.add_option("--twosided", type="inkbool", action="store",
                                      dest="twosided", default=False)
@@ -367,47 +231,138 @@ class HotWire(inkex.Effect):
         self.OptionParser.add_option("--uvplane", type="float", action="store",
                                      dest="uvplane", default=100.0)
 
-
-    def effect(self):
-
-        root = self.document.getroot()
+    def readLayers(self, count, cache, profile, pool):
+        """Read the paths of the first count layers of the document
+        :return:	list of lists of Paths, one per layer
+        """
         layers = []
-        for item in root.getchildren():
+        for item in self.document.getroot().getchildren():
             if item.tag == inkex.addNS("g",'svg') and item.get(inkex.addNS('groupmode','inkscape')) == 'layer':
                 layers.append(item)
+        return getLayerPaths(layers[:count], self.options.flat, cache, profile, pool)
+
+    def effect(self):
 
-        if len(layers) == 0:
-            # XX error message
-            return
-        
-        path1 = sortPaths(getPaths(layers[0], self.options.flat))
-        path2 = None
+        directory = self.options.directory
+        if directory.startswith("$HOME"):
+            directory = "/home/" + os.getenv('USERNAME') + directory[5:]
 
-        if len(layers) >= 2 and self.options.twosided:
-            path2 = sortPaths(getPaths(layers[1], self.options.flat))
+        outfile_orig = outfile = os.path.join(directory, self.options.file)
 
-        if not path2:
-            path2 = path1
+        # put number before file name extension
+        outfile_orig = outfile_orig.rsplit(".", 1)
+        if len(outfile_orig) == 2:
+            outfile_orig = ".%i.".join(outfile_orig)
         else:
-            if len(path1) != len(path2):
-                # XXX Error message
-                sys.stderr.write("Two sides have a different number of paths")
-                l = min(len(path1), len(path2))
-                path1 = path1[:l]
-                path2 = path2[:l]
-                #return
-            for i in range(len(path1)):
-                alignLinePaths(path1[i], path2[i])
+            outfile_orig = outfile_orig[0] + ".%i"
+
+        i = 0
+        while os.path.exists(outfile) and self.options.add_numeric_suffix_to_filename:
+            i += 1
+            outfile = outfile_orig % i
+
+        profile = NoProfile()
+        if self.options.profile:
+            profile = Profile(self.options.profilestage)
+
+        cache = None
+        if self.options.flatcache:
+            cache = FlatCache(os.path.expanduser(self.options.cachedir),
+                              int(self.options.cachesize * (1<<20)))
+
+        pool = None
+        if self.options.jobs != 1:
+            import multiprocessing
+            pool = multiprocessing.Pool(self.options.jobs or None)
+
+        try:
+            sides = self.readLayers(self.options.twosided and 2 or 1,
+                                    cache, profile, pool)
+            if len(sides) == 0:
+                # XX error message
+                return
+            with profile.stage("sort"):
+                sides = [sortPaths(paths) for paths in sides]
+            profile.count("sort", paths=sum(len(paths) for paths in sides))
+            path1 = sides[0]
+            path2 = None
+            if len(sides) > 1:
+                path2 = sides[1]
+
+            if not path2:
+                path2 = path1
+            else:
+                with profile.stage("match"):
+                    pairs, unmatched1, unmatched2 = matchPaths(
+                        path1, path2, self.options.matchdistance)
+                profile.count("match", pairs=len(pairs), unmatched=
+                              len(unmatched1) + len(unmatched2))
+                for side, paths, unmatched in ((1, path1, unmatched1),
+                                               (2, path2, unmatched2)):
+                    if unmatched:
+                        sys.stderr.write("No match for %i paths of layer %i: %s\n" % (
+                                len(unmatched), side, ", ".join(
+                                    paths[i].tag.get("id") or "#%i" % i
+                                    for i in unmatched)))
+                    # leaving out part of a connected run cuts another shape
+                    idxs = [i for i in xrange(len(paths)) if paths[i]]
+                    for run in connectedRuns(idxs, paths, paths):
+                        if len(run) > 1 and set(run).intersection(unmatched):
+                            raise HotWireError("Unmatched paths are connected to "
+                                               "other paths, nothing cut")
+                path1 = [path1[i] for i, j in pairs]
+                path2 = [path2[j] for i, j in pairs]
+
+            if self.options.optimize:
+                with profile.stage("optimize"):
+                    path1, path2, before, after = orderPaths(path1, path2)
+                s = 1 / 3.5433071 # scale svg units to mm
+                sys.stderr.write("Travel between paths: %.1fmm before, %.1fmm after optimizing\n" %
+                                 (before * s, after * s))
+
+            speed = min(self.options.cspeed, self.options.mspeed)
+
+            # segments of unchanged path pairs from the last export
+            segments = None
+            cached = [None] * len(path1)
+            if self.options.incremental:
+                segments = SegmentCache(os.path.join(directory, self.options.file)
+                                        + ".segments")
+                settings = self.segmentSettings(speed)
+                keys = [p1 and p2 and segmentKey(p1, p2, settings) or None
+                        for p1, p2 in zip(path1, path2)]
+                if self.options.softkerf and self.options.ccorrection:
+                    keys = chainKeys(path1, path2, keys)
+                cached = [k and segments.get(k) for k in keys]
+                hits = len(cached) - cached.count(None)
+                profile.count("incremental", hits=hits, misses=len(cached) - hits)
+                sys.stderr.write("Reusing %i of %i paths from the last export\n" %
+                                 (hits, len(cached)))
+
+            if path2 is not path1:
+                with profile.stage("align"):
+                    for i in range(len(path1)):
+                        if cached[i] is not None:
+                            path1[i].setPoints(array('d', cached[i][0]))
+                            path2[i].setPoints(array('d', cached[i][1]))
+                    alignPaths(path1, path2, self.options.aligntolerance * 3.5433071,
+                               self.options.alignpoints, cached, pool)
+                profile.count("align", paths=len(path1),
+                              points=sum(len(p) for p in path1))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
 
         # Tell the paths which number they have in the overall order
-        for nr, p in enumerate(path1):
-            p.setNr(nr)
-            sys.stderr.write("%i\n" % (nr))
-            p.backToSVG(0, self.style)
-        if path2 is not path1:
-            for nr, p in enumerate(path2):
+        with profile.stage("svg"):
+            for nr, p in enumerate(path1):
                 p.setNr(nr)
-                p.backToSVG(1, self.style)
+                p.backToSVG(0, self.style)
+            if path2 is not path1:
+                for nr, p in enumerate(path2):
+                    p.setNr(nr)
+                    p.backToSVG(1, self.style)
 
         # Add Markers to SVG file (if not yet present
         self.addMarker(
@@ -423,59 +378,136 @@ class HotWire(inkex.Effect):
             'M 5.0,0.0 L 0.0,5.0 L -5.0,0.0 L 0.0,-5.0 z ')
 
 
-        directory = self.options.directory
-        if directory.startswith("$HOME"):
-            directory = "/home/" + os.getenv('USERNAME') + directory[5:]
-
-        outfile_orig = outfile = os.path.join(directory, self.options.file)
+        if self.options.toolpath:
+            with profile.stage("toolpath"):
+                self.saveToolpath(os.path.join(directory, self.options.toolpath),
+                                  path1, path2)
 
-        # put number before file name extension
-        outfile_orig = outfile_orig.rsplit(".", 1)
-        if len(outfile_orig) == 2:
-            outfile_orig = ".%i.".join(outfile_orig)
-        else:
-            outfile_orig = outfile_orig[0] + ".%i"
-
-        i = 0
-        while os.path.exists(outfile) and self.options.add_numeric_suffix_to_filename:
-            i += 1
-            outfile = outfile_orig % i
+        with profile.stage("machine"):
+            if segments is None:
+                paths, correction = self.machineMoves(path1, path2, speed)
+            else:
+                paths, correction = self.incrementalMoves(
+                    path1, path2, speed, keys, cached, segments)
+                segments.save()
+            feeds = None
+            if self.options.feedplanning:
+                feeds = planFeeds(paths, speed, self.options.feedstep / 100.0)
+        profile.count("machine", paths=len(paths),
+                      moves=sum(len(p) for p in paths))
+
+        with profile.stage("gcode"):
+            cd = self.options.cdiam
+            out = outfile
+            bufsize = 1<<20
+            streamerror = ()
+            if self.options.device:
+                from gcodestream import Streamer, StreamError
+                streamerror = StreamError
+                out = Streamer(self.options.device, self.options.baudrate,
+                               self.options.rxbuffer)
+                # start sending early
+                bufsize = 1<<12
+            writer = GCodeWriter(
+                out, speed,
+                ["G40", "G42 D%.2f" % cd, "G41 D%.2f" % cd][correction],
+                lineFormatter(self.options.axes), arcFormatter(self.options.axes),
+                bufsize)
+            try:
+                writer.writePaths(paths, feeds)
+                writer.close()
+                if self.options.device:
+                    out.close()
+            except streamerror, e:
+                out.abort()
+                sys.stderr.write("Streaming to %s failed: %s\n" %
+                                 (self.options.device, e))
+            if self.options.device:
+                sys.stderr.write(out.report())
+        profile.count("gcode", lines=writer.lines, bytes=writer.bytes)
+
+        if self.options.estimate:
+            from cycletime import estimatePaths
+            with profile.stage("estimate"):
+                result = estimatePaths(paths, speed, self.options.mspeed, feeds,
+                                       accel=self.options.accel,
+                                       deviation=self.options.deviation)
+            sys.stderr.write(result.report())
+
+        if self.options.profile:
+            profile.write(self.options.profilefile)
+
+    # options stored with a toolpath, used by toolpath.py
+    toolpathOptions = ("cspeed", "mspeed", "ccorrection", "cdiam", "softkerf",
+                       "mwidth", "xyplane", "uvplane", "simplify", "arcs",
+                       "arctolerance", "uvarcs", "feedplanning", "feedstep", "axes",
+                       "accel", "deviation")
+
+    def saveToolpath(self, filename, path1, path2):
+        """Write the aligned paths in machine coordinates to a file"""
+        metadata = {
+            "source" : self.svg_file,
+            "created" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "twosided" : path2 is not path1,
+            "options" : dict((name, getattr(self.options, name))
+                             for name in self.toolpathOptions),
+            }
+        try:
+            writeToolpath(filename, machinePaths(path1, path2), metadata)
+        except (IOError, OSError), e:
+            sys.stderr.write("Could not write toolpath: %s\n" % e)
+
+    def segmentSettings(self, speed):
+        """Options that change the moves of a path pair"""
+        o = self.options
+        return (o.aligntolerance, o.alignpoints, o.ccorrection, o.cdiam,
+                o.softkerf, o.xyplane, o.uvplane, o.mwidth, o.simplify,
+                o.arcs, o.arctolerance, o.uvarcs, speed)
+
+    def incrementalMoves(self, path1, path2, speed, keys, cached, segments):
+        """Same as machineMoves, but only for the path pairs not found
+        in the segment cache. New segments are added to the cache.
+        :param keys:	segment key per path pair
+        :param cached:	segment or None per path pair
+        """
+        idxs = [i for i in xrange(len(path1)) if path1[i]]
+        todo = [i for i in idxs if cached[i] is None]
+        new1 = [path1[i] for i in todo]
+        new2 = new1
+        if path2 is not path1:
+            new2 = [path2[i] for i in todo]
+        moves, correction = self.machineMoves(new1, new2, speed)
+        moves = dict(zip(todo, moves))
+
+        paths = []
+        for i in idxs:
+            if i in moves:
+                if keys[i]:
+                    data1 = data2 = None
+                    if path2 is not path1:
+                        data1 = path1[i].array().tostring()
+                        data2 = path2[i].array().tostring()
+                    segments.put(keys[i], (data1, data2, moves[i]))
+                paths.append(moves[i])
+            else:
+                paths.append(cached[i][2])
+        return paths, correction
 
-        f = open(outfile, "w")
-
-        f.write("""%%
-G21 (use mm)
-F%.0f (Speed)
-""" % min(self.options.cspeed, self.options.mspeed))
-
-        cd = self.options.cdiam
-        f.write(["G40", "G42 D%.2f" % cd, "G41 D%.2f" % cd][self.options.ccorrection])
-        f.write("\n\n")
-
-        s = 1 / 3.5433071 # scale svg units to mm
-
-        for p1, p2 in zip(path1, path2):
-            if not p1:
-                continue
-            # sys.stderr.write("%s %s\n" % (repr(p1), repr(p2)))
-            #p1, p2 = alignLinePaths(p1, p2)
-            # XXX projection to outer planes
-            for i in xrange(len(p1)):
-                x, y = p1[i]
-                u, v = p2[i]
-                x, y = s*x, (1052.3622-y)*s
-                u, v = s*u, (1052.3622-v)*s
-                # reverse Y and V axis to go from svg to inkscape coordinates
-                f.write("G01 X%7.2f Y%7.2f U%7.2f V%7.2f\n" % (x, y, u, v))
-        f.write("""
-M30 (End Program)
-%
-""")
-        f.close()
+    def machineMoves(self, path1, path2, speed):
+        """Convert aligned paths to machine coordinates and apply the
+        options for kerf, projection, simplification and arcs
+        :return:	list of lists of moves, cutter correction
+        """
+        return machineMoves(list(machinePaths(path1, path2)), self.options,
+                            path2 is not path1)
 
 if __name__ == '__main__':
     e = HotWire()
-    e.affect()
+    try:
+        e.affect()
+    except HotWireError, err:
+        sys.stderr.write("%s\n" % err)
+        sys.exit(1)
 
 
 # vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 encoding=utf-8 textwidth=99
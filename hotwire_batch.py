@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+'''
+Copyright (C) 2012, Florian Festi
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+'''
+"""Convert many SVG files to G-code without Inkscape
+
+Usage: hotwire_batch.py [hotwire options] [--jobs JOBS] [-o OUTDIR] FILES...
+
+Takes the same options as the Inkscape extension (see hotwire.inx).
+FILES may contain glob patterns. One G-code file is written per input
+into OUTDIR, named after the SVG file. The SVG files are read while they
+are parsed, so the memory needed does not grow with their size.
+"""
+import sys
+import os
+import glob
+import time
+import traceback
+import multiprocessing
+
+import hotwire
+from hotwirecore import iterLayers
+
+class StreamingHotWire(hotwire.HotWire):
+    """HotWire reading the svg file layer by layer instead of loading
+    the whole document. Nothing is written back to the svg.
+    """
+
+    def readLayers(self, count, cache, profile, pool):
+        sides = []
+        for label, paths in iterLayers(self.svg_file, self.options.flat,
+                                       cache, profile, pool):
+            sides.append(paths)
+            if len(sides) == count:
+                break
+        return sides
+
+    def addMarker(self, name, path, transform=None):
+        pass
+
+def convert(job):
+    """Convert one SVG file, runs in the worker processes
+    :param job:	(options, svg file name, G-code file name)
+    :return:	(svg file name, seconds, error message or None)
+    """
+    options, svgfile, outfile = job
+    start = time.time()
+    try:
+        e = StreamingHotWire()
+        e.options = options
+        e.options.directory, e.options.file = os.path.split(outfile)
+        e.options.add_numeric_suffix_to_filename = False
+        e.args = [svgfile]
+        e.svg_file = svgfile
+        e.effect()
+    except Exception:
+        return svgfile, time.time() - start, traceback.format_exc()
+    return svgfile, time.time() - start, None
+
+def main(argv=sys.argv[1:]):
+    parser = hotwire.HotWire().OptionParser
+    parser.usage = "%prog [options] FILES..."
+    # --jobs comes from the extension, used for the files or within a file
+    parser.set_defaults(jobs=multiprocessing.cpu_count())
+    parser.add_option("-o", "--outdir", action="store", type="string",
+                      dest="outdir", default=".",
+                      help="Directory for the G-code files")
+    parser.add_option("-e", "--extension", action="store", type="string",
+                      dest="extension", default=".ngc",
+                      help="File name extension of the G-code files")
+    options, args = parser.parse_args(argv)
+
+    files = []
+    for arg in args:
+        files.extend(sorted(glob.glob(arg)) or [arg])
+    if not files:
+        parser.error("No SVG files given")
+
+    jobs = []
+    for svgfile in files:
+        name = os.path.splitext(os.path.basename(svgfile))[0]
+        jobs.append((options, svgfile,
+                     os.path.join(options.outdir, name + options.extension)))
+
+    start = time.time()
+    if options.jobs != 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(options.jobs or multiprocessing.cpu_count(),
+                                        len(jobs)))
+        # worker processes must not start pools of their own
+        options.jobs = 1
+        results = pool.imap_unordered(convert, jobs)
+    else:
+        pool = None
+        results = (convert(job) for job in jobs)
+
+    failed = []
+    for svgfile, seconds, error in results:
+        if error:
+            failed.append(svgfile)
+            sys.stderr.write("%s: FAILED after %.2fs\n%s" % (svgfile, seconds, error))
+        else:
+            sys.stderr.write("%s: %.2fs\n" % (svgfile, seconds))
+    if pool:
+        pool.close()
+        pool.join()
+
+    sys.stderr.write("%i files in %.2fs, %i failed\n" %
+                     (len(jobs), time.time() - start, len(failed)))
+    for svgfile in failed:
+        sys.stderr.write("  failed: %s\n" % svgfile)
+    return failed and 1 or 0
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 encoding=utf-8 textwidth=99
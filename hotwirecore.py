@@ -0,0 +1,1620 @@
+'''
+Copyright (C) 2012, Florian Festi
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+'''
+"""Geometry of the hot wire extension, without Inkscape dependencies
+
+Flattening of svg path data, sorting, ordering, matching and aligning of
+paths, the caches and the profiler. The modules shipped with Inkscape
+(cubicsuperpath, simpletransform) are only imported when svg data is
+actually read, so scripts working on already flattened paths start fast.
+"""
+import sys
+sys.path.append("/usr/share/inkscape/extensions")
+import os
+import math
+import heapq
+import cPickle
+import hashlib
+import time
+from array import array
+from collections import OrderedDict
+from itertools import izip
+
+SVG_NS = "http://www.w3.org/2000/svg"
+SVG_SVG = "{%s}svg" % SVG_NS
+SVG_G = "{%s}g" % SVG_NS
+SVG_PATH = "{%s}path" % SVG_NS
+INKSCAPE_NS = "http://www.inkscape.org/namespaces/inkscape"
+INKSCAPE_GROUPMODE = "{%s}groupmode" % INKSCAPE_NS
+INKSCAPE_LABEL = "{%s}label" % INKSCAPE_NS
+
+def distances(points):
+    """Calculate the distances for a list of points
+    :param points:	iterable of float pairs
+    :return:		list of distance
+    """
+    if not points:
+        return [0]
+    lastpt = points[0]
+    dists = []
+    for pt in points[1:]:
+        dists.append(math.sqrt((pt[0]-lastpt[0])**2 + (pt[1]-lastpt[1])**2))
+        lastpt = pt
+    return dists
+
+def intermediatePoint(pt1, pt2, relDist=0.5):
+    q = relDist
+    r = 1 - relDist 
+    return (pt1[0]*r + pt2[0]*q, pt1[1]*r + pt2[1]*q)
+
+def arcLengths(points):
+    """Cumulative length along a list of points
+    :param points:	list of float pairs
+    :return:		list of lengths, starting with 0.0
+    """
+    lengths = [0.0]
+    total = 0.0
+    hypot = math.hypot
+    for i in xrange(1, len(points)):
+        total += hypot(points[i][0]-points[i-1][0], points[i][1]-points[i-1][1])
+        lengths.append(total)
+    return lengths
+
+def _pointAt(points, lengths, idx, pos):
+    """Point at length pos on the segment from points[idx-1] to points[idx]"""
+    l = lengths[idx] - lengths[idx-1]
+    if l <= 0.0:
+        return points[idx]
+    return intermediatePoint(points[idx-1], points[idx],
+                             (pos - lengths[idx-1]) / l)
+
+def resamplePath(points, lengths, positions):
+    """Points at the given sorted lengths along the path"""
+    if len(points) < 2:
+        # a single point stays where it is
+        return [points[0]] * len(positions)
+    result = []
+    idx = 1
+    last = len(points) - 1
+    for pos in positions:
+        while idx < last and lengths[idx] < pos:
+            idx += 1
+        result.append(_pointAt(points, lengths, idx, pos))
+    return result
+
+def alignLinePaths(points1, points2, tolerance=0.5, npoints=0):
+    """Takes two arrays of (x, y) points
+       returns two arrays of points with the same number of points
+
+    Both sides are parameterized by their arc length with the second side
+    scaled to the length of the first. Points closer than tolerance are
+    paired directly, every other point gets an interpolated partner.
+    :param tolerance:	match distance in units of the first side
+    :param npoints:	if set resample both sides to that many points
+    			evenly spaced along the path instead
+    """
+    result1, result2 = points1, points2
+    points1 = list(points1)
+    points2 = list(points2)
+    lengths1 = arcLengths(points1)
+    lengths2 = arcLengths(points2)
+    # factor that points2 moves faster that points1
+    if lengths2[-1] > 0.0 and lengths1[-1] > 0.0:
+        f = lengths1[-1] / lengths2[-1]
+        lengths2 = [l * f for l in lengths2]
+
+    if npoints > 1:
+        # the first side may be a single point
+        total = lengths1[-1] or lengths2[-1]
+        positions = [total * i / (npoints-1) for i in xrange(npoints)]
+        result1[:] = resamplePath(points1, lengths1, positions)
+        result2[:] = resamplePath(points2, lengths2, positions)
+        return
+
+    new1 = [points1[0]]
+    new2 = [points2[0]]
+    idx1 = 1
+    idx2 = 1
+    len1 = len(points1)
+    len2 = len(points2)
+    while idx1 < len1 and idx2 < len2:
+        l1 = lengths1[idx1]
+        l2 = lengths2[idx2]
+        if abs(l1-l2) < tolerance: # both point match
+            new1.append(points1[idx1])
+            new2.append(points2[idx2])
+            idx1 += 1
+            idx2 += 1
+        elif l1 < l2:
+            # Add Point1 and intermediate point to 2
+            new1.append(points1[idx1])
+            new2.append(_pointAt(points2, lengths2, idx2, l1))
+            idx1 += 1
+        else:
+            # Add Point2 and intermediate point to 1
+            new2.append(points2[idx2])
+            new1.append(_pointAt(points1, lengths1, idx1, l2))
+            idx2 += 1
+    # check for remaining points
+    if idx1 < len1 or idx2 < len2:
+        new1.append(points1[-1])
+        new2.append(points2[-1])
+
+    result1[:] = new1
+    result2[:] = new2
+
+def _removePath(d, p, starts=None):
+    d[p[0]].remove(p)
+    if not d[p[0]]:
+        del d[p[0]]
+    d[p[-1]].remove(p)
+    if not d[p[-1]]:
+        del d[p[-1]]
+    # update the ranks of the remaining ends
+    if starts is not None:
+        for pt in (p[0], p[-1]):
+            if pt in d:
+                heapq.heappush(starts, (_startRank(pt, d), pt))
+
+
+def _startRank(pt, ends):
+    """Rank of an end point as start point, lower is better"""
+    l = len(ends[pt])
+    # Prefere starts
+    s_cnt = 0
+    for p in ends[pt]:
+        if p[0] == pt:
+            s_cnt = 1
+            break
+    # Prefere uneven connection count, then starts, then more connections
+    return (-(l % 2), -s_cnt, -l)
+
+def _endIndex(paths, eps=0.001):
+    """Snap end points closer than eps to each other and index them
+
+    End points are hashed into a grid of cell size eps, so only the
+    neighbouring cells need to be searched for a match.
+    :param paths:	list of point lists, end points are replaced in place
+    :param eps:		tolerance for points to be considered the same
+    :return:		dict end point -> [paths]
+    """
+    grid = {}
+    for idx in (0, -1):
+        for p in paths:
+            pt = p[idx]
+            cx = int(math.floor(pt[0] / eps))
+            cy = int(math.floor(pt[1] / eps))
+            for cell in ((cx, cy), (cx-1, cy), (cx+1, cy),
+                         (cx, cy-1), (cx-1, cy-1), (cx+1, cy-1),
+                         (cx, cy+1), (cx-1, cy+1), (cx+1, cy+1)):
+                for other in grid.get(cell, ()):
+                    if (abs(other[0]-pt[0]) < eps and
+                        abs(other[1]-pt[1]) < eps):
+                        p[idx] = other
+                        break
+                else:
+                    continue
+                break
+            else:
+                grid.setdefault((cx, cy), []).append(pt)
+
+    # build ends hash: endpoint -> [paths]
+    ends = {}
+    for p in paths:
+        if len(p) == 1:
+            continue
+        if len(p) == 2 and p[0] == p[1]:
+            continue
+
+        ends.setdefault(p[0], []).append(p)
+        ends.setdefault(p[-1], []).append(p)
+    return ends
+
+def _startPath(ends, starts):
+    """Pick the best path to start with, remove it from ends and return it
+    turned around so that it starts at the chosen end point
+    :param ends:	dict end point -> [paths]
+    :param starts:	heap of (rank, end point), may contain outdated entries
+    """
+    # look for a good starting point
+    while True:
+        rank, startpt = heapq.heappop(starts)
+        if startpt in ends and rank == _startRank(startpt, ends):
+            break
+
+    for path in ends[startpt]:
+        if path[0] == startpt:
+            break
+    else: # no start point
+        path = ends[startpt][0]
+        path.reverse()
+    _removePath(ends, path, starts)
+    return path
+
+def sortPaths(paths):
+    #pprint(paths, sys.stderr)
+    if not paths:
+        return []
+    if len(paths) == 1:
+        return [paths[0]]
+
+    ends = _endIndex(paths)
+    starts = [(_startRank(pt, ends), pt) for pt in ends]
+    heapq.heapify(starts)
+
+    newpaths = [_startPath(ends, starts)]
+    pos = 0
+    chain = 0
+
+    while ends:
+        if not newpaths[pos][-1] in ends:
+            ### look for new loop
+            for n in xrange(chain, len(newpaths)):
+                if newpaths[n][-1] in ends:
+                    pos = n
+                    break
+            else:
+                # no continuous path found, start a new one
+                newpaths.append(_startPath(ends, starts))
+                pos = chain = len(newpaths) - 1
+                continue
+        p2 = ends[newpaths[pos][-1]][0]
+        if p2[-1] == newpaths[pos][-1]:
+            p2.reverse()
+        pos += 1
+        newpaths.insert(pos, p2)
+        _removePath(ends, p2, starts)
+
+    #pprint(newpaths, sys.stderr)
+    return newpaths
+
+def mergePaths(paths):
+    result = paths[0]
+    for p in paths[1:]:
+        if p[0] == result[-1]:
+            result.extend(p[1:])
+        else:
+            result.extend(p)
+    return result
+
+def pointDistance(pt1, pt2):
+    """Euclidean distance of two points with any number of coordinates"""
+    if len(pt1) == 2:
+        return math.hypot(pt1[0]-pt2[0], pt1[1]-pt2[1])
+    return math.sqrt(sum((a-b)*(a-b) for a, b in zip(pt1, pt2)))
+
+class KDTree(object):
+    """k-d tree over a fixed list of points (tuples of equal length)
+
+    Points can be removed from the tree, so it can be used to find the
+    nearest not yet visited point.
+    """
+
+    def __init__(self, points):
+        self.points = points
+        self.k = points and len(points[0]) or 0
+        self.alive = [True] * len(points)
+        # nodes are stored in parallel lists
+        self.idx = []
+        self.axis = []
+        self.left = []
+        self.right = []
+        self.parent = []
+        self.count = []
+        self.node = [None] * len(points)
+        self.root = self._build(range(len(points)), 0, -1)
+
+    def _build(self, indices, depth, parent):
+        if not indices:
+            return -1
+        axis = depth % self.k
+        indices.sort(key=lambda i: self.points[i][axis])
+        mid = len(indices) // 2
+        n = len(self.idx)
+        self.idx.append(indices[mid])
+        self.axis.append(axis)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.parent.append(parent)
+        self.count.append(len(indices))
+        self.node[indices[mid]] = n
+        self.left[n] = self._build(indices[:mid], depth+1, n)
+        self.right[n] = self._build(indices[mid+1:], depth+1, n)
+        return n
+
+    def __len__(self):
+        return self.root >= 0 and self.count[self.root] or 0
+
+    def remove(self, i):
+        """Remove point with index i from further queries"""
+        if not self.alive[i]:
+            return
+        self.alive[i] = False
+        n = self.node[i]
+        while n >= 0:
+            self.count[n] -= 1
+            n = self.parent[n]
+
+    def nearest(self, pt, k=1):
+        """Return list of (distance, index) of the k nearest points"""
+        best = [] # heap of (-distance, index)
+        stack = [(self.root, 0.0)]
+        points = self.points
+        while stack:
+            n, mindist = stack.pop()
+            if n < 0 or not self.count[n]:
+                continue
+            if len(best) == k and mindist >= -best[0][0]:
+                continue
+            i = self.idx[n]
+            if self.alive[i]:
+                d = pointDistance(pt, points[i])
+                if len(best) < k:
+                    heapq.heappush(best, (-d, i))
+                elif d < -best[0][0]:
+                    heapq.heapreplace(best, (-d, i))
+            diff = pt[self.axis[n]] - points[i][self.axis[n]]
+            if diff < 0:
+                stack.append((self.right[n], -diff))
+                stack.append((self.left[n], mindist))
+            else:
+                stack.append((self.left[n], diff))
+                stack.append((self.right[n], mindist))
+        return sorted((-d, i) for d, i in best)
+
+def _travel(order, entries, exits):
+    """Sum of the non cutting moves between the units of order
+    :param order:	list of (unit, reversed) pairs
+    """
+    travel = 0.0
+    last = None
+    for u, rev in order:
+        if last is not None:
+            travel += pointDistance(last, rev and exits[u] or entries[u])
+        last = rev and entries[u] or exits[u]
+    return travel
+
+def optimizeOrder(entries, exits, neighbours=8, passes=10):
+    """Find an order of units minimizing the moves between them
+
+    The first unit is kept as start. The tour is seeded by nearest
+    neighbours and improved by 2-opt and Or-opt moves. All candidates
+    are taken from a k-d tree of the end points.
+    :param entries:	list of entry points of the units
+    :param exits:	list of exit points of the units
+    :param neighbours:	number of candidates to check per improvement step
+    :param passes:	maximal number of improvement passes
+    :return:		list of (unit, reversed) pairs
+    """
+    n = len(entries)
+    if n < 3:
+        return [(u, False) for u in xrange(n)]
+    # point 2*u is the entry of unit u, 2*u+1 the exit
+    ends = []
+    for u in xrange(n):
+        ends.append(entries[u])
+        ends.append(exits[u])
+
+    # nearest neighbour seeding
+    tree = KDTree(ends)
+    tree.remove(0)
+    tree.remove(1)
+    tour = [0]
+    rev = [False] * n
+    pos = exits[0]
+    while len(tour) < n:
+        d, i = tree.nearest(pos)[0]
+        u = i // 2
+        rev[u] = bool(i % 2)
+        tree.remove(2*u)
+        tree.remove(2*u+1)
+        tour.append(u)
+        pos = rev[u] and entries[u] or exits[u]
+
+    # candidate lists: the nearest end points of every end point
+    tree = KDTree(ends)
+    near = [tree.nearest(pt, neighbours+1)[1:] for pt in ends]
+
+    def entry(u):
+        return rev[u] and exits[u] or entries[u]
+
+    def exit(u):
+        return rev[u] and entries[u] or exits[u]
+
+    def dist(a, b):
+        return pointDistance(a, b)
+
+    for dummy in xrange(passes):
+        improved = False
+        where = [0] * n
+        for p, u in enumerate(tour):
+            where[u] = p
+
+        # 2-opt: reverse tour[i:j+1], connecting exit(tour[i-1]) with
+        # the current exit of tour[j]
+        for i in xrange(1, n):
+            a = exit(tour[i-1])
+            for d, pt in near[2*tour[i-1] + 1 - rev[tour[i-1]]]:
+                u = pt // 2
+                if bool(pt % 2) == rev[u]: # is the entry, not the exit
+                    continue
+                j = where[u]
+                if j < i:
+                    continue
+                old = dist(a, entry(tour[i]))
+                new = d
+                if j + 1 < n:
+                    old += dist(exit(tour[j]), entry(tour[j+1]))
+                    new += dist(entry(tour[i]), entry(tour[j+1]))
+                if new < old - 1e-9:
+                    segment = tour[i:j+1]
+                    segment.reverse()
+                    tour[i:j+1] = segment
+                    for p in xrange(i, j+1):
+                        rev[tour[p]] = not rev[tour[p]]
+                        where[tour[p]] = p
+                    improved = True
+                    break
+
+        # Or-opt: move runs of up to three units behind a unit close
+        # to their entry or exit, turning them around if needed
+        for length in (1, 2, 3):
+            i = 1
+            while i + length <= n:
+                first, last = tour[i], tour[i+length-1]
+                prev = exit(tour[i-1])
+                succ = i + length < n and entry(tour[i+length]) or None
+                removed = dist(prev, entry(first))
+                if succ is not None:
+                    removed += dist(exit(last), succ) - dist(prev, succ)
+                best = None
+                for pt in (2*first + rev[first], 2*last + 1 - rev[last]):
+                    for d, e in near[pt]:
+                        u = e // 2
+                        if bool(e % 2) == rev[u]: # only insert after exits
+                            continue
+                        k = where[u]
+                        if i - 1 <= k < i + length:
+                            continue
+                        a = exit(u)
+                        b = k + 1 < n and entry(tour[k+1]) or None
+                        for reverse in (False, True):
+                            s, t = entry(first), exit(last)
+                            if reverse:
+                                s, t = t, s
+                            added = dist(a, s)
+                            if b is not None:
+                                added += dist(t, b) - dist(a, b)
+                            if added < removed - 1e-9 and (
+                                best is None or added < best[0]):
+                                best = (added, k, reverse)
+                if best is None:
+                    i += 1
+                    continue
+                added, k, reverse = best
+                segment = tour[i:i+length]
+                if reverse:
+                    segment.reverse()
+                    for u in segment:
+                        rev[u] = not rev[u]
+                del tour[i:i+length]
+                if k > i:
+                    k -= length
+                tour[k+1:k+1] = segment
+                for p in xrange(min(i, k+1), n):
+                    where[tour[p]] = p
+                improved = True
+        if not improved:
+            break
+
+    return [(u, rev[u]) for u in tour]
+
+def connectedRuns(idxs, paths1, paths2):
+    """Split the sorted indices idxs into runs of connected paths, where
+    each path starts at the end of the one before on both sides"""
+    chains = []
+    for n, i in enumerate(idxs):
+        if (n and idxs[n-1] == i-1 and
+            paths1[i-1][-1] == paths1[i][0] and
+            paths2[i-1][-1] == paths2[i][0]):
+            chains[-1].append(i)
+        else:
+            chains.append([i])
+    return chains
+
+def orderPaths(paths1, paths2=None):
+    """Reorder paths to minimize the moves between unconnected paths
+
+    Runs of connected paths are kept together and may only be reversed as
+    a whole. If paths2 is given the same reordering is applied to both
+    lists and the distances are measured in XYUV.
+    :return:	paths1, paths2, travel before, travel after
+    """
+    if paths2 is None:
+        paths2 = paths1
+    empty = [i for i in xrange(len(paths1)) if not paths1[i] or not paths2[i]]
+    idxs = [i for i in xrange(len(paths1)) if paths1[i] and paths2[i]]
+
+    chains = connectedRuns(idxs, paths1, paths2)
+    if paths2 is paths1:
+        entries = [paths1[c[0]][0] for c in chains]
+        exits = [paths1[c[-1]][-1] for c in chains]
+    else:
+        entries = [paths1[c[0]][0] + paths2[c[0]][0] for c in chains]
+        exits = [paths1[c[-1]][-1] + paths2[c[-1]][-1] for c in chains]
+
+    order = optimizeOrder(entries, exits)
+    before = _travel([(u, False) for u in xrange(len(chains))],
+                     entries, exits)
+    after = _travel(order, entries, exits)
+
+    new1 = []
+    new2 = []
+    for u, reverse in order:
+        chain = chains[u]
+        if reverse:
+            chain = chain[::-1]
+            for i in chain:
+                paths1[i].reverse()
+                if paths2[i] is not paths1[i]:
+                    paths2[i].reverse()
+        new1.extend(paths1[i] for i in chain)
+        new2.extend(paths2[i] for i in chain)
+    new1.extend(paths1[i] for i in empty)
+    new2.extend(paths2[i] for i in empty)
+    if paths2 is paths1:
+        new2 = new1
+    return new1, new2, before, after
+
+def pathDescriptor(points):
+    """Describe a path by its centroid, extent and length
+    :return:	(cx, cy, width, height, length)
+    """
+    xs = [pt[0] for pt in points]
+    ys = [pt[1] for pt in points]
+    # centroid of the lines, weighted by their length
+    length = 0.0
+    cx = cy = 0.0
+    for i in xrange(1, len(xs)):
+        l = math.hypot(xs[i]-xs[i-1], ys[i]-ys[i-1])
+        length += l
+        cx += l * (xs[i] + xs[i-1])
+        cy += l * (ys[i] + ys[i-1])
+    if length > 0.0:
+        cx /= 2 * length
+        cy /= 2 * length
+    else:
+        cx, cy = xs[0], ys[0]
+    return (cx, cy, max(xs) - min(xs), max(ys) - min(ys), length)
+
+def _boundingBox(paths):
+    """Normalization (center x, center y, scale) from the bounding box of
+    all points of paths"""
+    x0 = y0 = float("inf")
+    x1 = y1 = -x0
+    for p in paths:
+        for pt in p:
+            x0 = min(x0, pt[0])
+            x1 = max(x1, pt[0])
+            y0 = min(y0, pt[1])
+            y1 = max(y1, pt[1])
+    if x0 > x1:
+        return (0.0, 0.0, 1.0)
+    return (0.5 * (x0 + x1), 0.5 * (y0 + y1), max(x1 - x0, y1 - y0) or 1.0)
+
+def _fitNorm(raw1, raw2, norm1):
+    """Normalization of the second side that maps the centroids of raw2
+    onto those of raw1 normalized with norm1"""
+    n = float(len(raw1))
+    m1x = sum(d[0] for d in raw1) / n
+    m1y = sum(d[1] for d in raw1) / n
+    m2x = sum(d[0] for d in raw2) / n
+    m2y = sum(d[1] for d in raw2) / n
+    s1 = sum((d[0]-m1x)**2 + (d[1]-m1y)**2 for d in raw1)
+    s2 = sum((d[0]-m2x)**2 + (d[1]-m2y)**2 for d in raw2)
+    if s1 > 0.0 and s2 > 0.0:
+        r = math.sqrt(s2 / s1)
+    else:
+        # one pair only, compare the sizes
+        r = (raw2[0][4] or 1.0) / (raw1[0][4] or 1.0)
+    return (m2x - r * (m1x - norm1[0]), m2y - r * (m1y - norm1[1]),
+            r * norm1[2])
+
+def _normalize(descriptors, norm):
+    """Make descriptors of one side independent of position and scale
+    :param norm:	(center x, center y, scale) e.g. of the bounding box
+    :return:		normalized descriptors
+    """
+    mx, my, scale = norm
+    return [((d[0]-mx) / scale, (d[1]-my) / scale, d[2] / scale,
+             d[3] / scale, d[4] / scale) for d in descriptors]
+
+def _matchDescriptors(desc1, desc2, maxdistance, candidates):
+    """Assign desc2 entries to desc1 entries
+    :return:	assignment, number of matches, sum of the differences
+    """
+    cand = []
+    if desc2:
+        tree = KDTree(desc2)
+        k = min(candidates, len(desc2))
+        for d in desc1:
+            cand.append(tree.nearest(d, k))
+    else:
+        cand = [[] for d in desc1]
+    assignment = _assign(cand, len(desc2), maxdistance)
+    matched = [(d, desc2[a]) for d, a in zip(desc1, assignment) if a is not None]
+    return (assignment, len(matched),
+            sum(pointDistance(d1, d2) for d1, d2 in matched))
+
+def _assign(candidates, m, maxcost):
+    """Minimal cost assignment of rows to columns
+
+    Hungarian method with Dijkstra on the candidate edges only. Every row
+    has an extra private column with cost maxcost, so rows without a good
+    match stay unassigned.
+    :param candidates:	list per row of (cost, column) pairs
+    :param m:		number of columns
+    :param maxcost:	cost of leaving a row unassigned
+    :return:		list of column or None per row
+    """
+    n = len(candidates)
+    # the private column of row i is m + i
+    edges = [list(c) + [(maxcost, m + i)] for i, c in enumerate(candidates)]
+    u = [0.0] * n
+    v = [0.0] * (m + n)
+    rowof = [-1] * (m + n)
+    colof = [-1] * n
+    inf = float("inf")
+    for s in xrange(n):
+        dist = {}
+        prev = {}
+        done = {}
+        heap = []
+        for c, j in edges[s]:
+            d = c - u[s] - v[j]
+            if d < dist.get(j, inf):
+                dist[j] = d
+                prev[j] = s
+                heapq.heappush(heap, (d, j))
+        while True:
+            d, j = heapq.heappop(heap)
+            if j in done or d > dist[j]:
+                continue
+            done[j] = d
+            i = rowof[j]
+            if i < 0:
+                break
+            for c, j2 in edges[i]:
+                if j2 in done:
+                    continue
+                d2 = d + c - u[i] - v[j2]
+                if d2 < dist.get(j2, inf):
+                    dist[j2] = d2
+                    prev[j2] = i
+                    heapq.heappush(heap, (d2, j2))
+        # update the potentials of the tree, then augment along it
+        D = d
+        u[s] += D
+        for j2, d2 in done.iteritems():
+            v[j2] -= D - d2
+            if rowof[j2] >= 0:
+                u[rowof[j2]] += D - d2
+        while True:
+            i = prev[j]
+            nextj = colof[i]
+            colof[i] = j
+            rowof[j] = i
+            if i == s:
+                break
+            j = nextj
+    result = []
+    for j in colof:
+        if j >= m:
+            j = None
+        result.append(j)
+    return result
+
+def _signedArea(points):
+    a = 0.0
+    for i in xrange(1, len(points)):
+        a += points[i-1][0] * points[i][1] - points[i][0] * points[i-1][1]
+    return a
+
+def matchPaths(paths1, paths2, maxdistance=0.25, candidates=8):
+    """Find the path of the second side that belongs to each path of the
+    first side
+
+    Paths are compared by their centroid, extent and length relative to
+    the bounding box of their side. With the same number of paths on both
+    sides they are paired in order, as long as no pair differs by more
+    than maxdistance. Otherwise the k-d tree gives the nearest candidates
+    and the assignment minimizes the sum of the differences. Paths of the
+    second side are reversed where needed to run in the same direction
+    as their partner.
+    :param maxdistance:	largest difference of matched paths
+    :param candidates:	number of candidates looked at per path
+    :return:		list of (index1, index2) in the order of paths1,
+    			unmatched indices of paths1 and of paths2
+    """
+    idx1 = [i for i in xrange(len(paths1)) if paths1[i]]
+    idx2 = [j for j in xrange(len(paths2)) if paths2[j]]
+    raw1 = [pathDescriptor(paths1[i]) for i in idx1]
+    raw2 = [pathDescriptor(paths2[j]) for j in idx2]
+    norm1 = _boundingBox(paths1[i] for i in idx1)
+    norm2 = _boundingBox(paths2[j] for j in idx2)
+    desc1 = _normalize(raw1, norm1)
+    desc2 = _normalize(raw2, norm2)
+
+    assignment = None
+    if len(idx1) == len(idx2):
+        if max([pointDistance(d1, d2)
+                for d1, d2 in zip(desc1, desc2)] or [0.0]) <= maxdistance:
+            assignment = range(len(idx2))
+    if assignment is None:
+        # Both sides are either drawn on top of each other or each side is
+        # placed and scaled on its own. Try both, keep the better matching.
+        best = None
+        for norm in (norm1, norm2):
+            assignment, count, cost = _matchDescriptors(
+                desc1, _normalize(raw2, norm), maxdistance, candidates)
+            if best is None or (count, -cost) > (best[1], -best[2]):
+                best = assignment, count, cost, norm
+        # Extra paths widen the bounding box of their side. Fit position
+        # and scale of the second side to the better half of the matches
+        # and try again until nothing changes.
+        assignment, count, cost, norm = best
+        for k in xrange(10):
+            if count < 2:
+                break
+            desc2 = _normalize(raw2, norm)
+            matched = sorted((pointDistance(desc1[n], desc2[a]), n, a)
+                             for n, a in enumerate(assignment)
+                             if a is not None)[:count//2+1]
+            last = norm
+            norm = _fitNorm([raw1[n] for c, n, a in matched],
+                            [raw2[a] for c, n, a in matched], norm1)
+            if pointDistance(norm, last) <= 1e-9 * last[2]:
+                break
+            assignment, count, cost = _matchDescriptors(
+                desc1, _normalize(raw2, norm), maxdistance, candidates)
+            if (count, -cost) > (best[1], -best[2]):
+                best = assignment, count, cost, norm
+        assignment, count, cost, norm2 = best
+
+    pairs = []
+    used = set()
+    for n, a in enumerate(assignment):
+        if a is None:
+            continue
+        i, j = idx1[n], idx2[a]
+        pairs.append((i, j))
+        used.add(j)
+        p1, p2 = paths1[i], paths2[j]
+        if p1[0] == p1[-1] and p2[0] == p2[-1]:
+            if (_signedArea(p1) < 0.0) != (_signedArea(p2) < 0.0):
+                p2.reverse()
+        else:
+            # compare ends relative to the size of each side
+            def rel(pt, norm):
+                return ((pt[0] - norm[0]) / norm[2], (pt[1] - norm[1]) / norm[2])
+            s1, e1 = rel(p1[0], norm1), rel(p1[-1], norm1)
+            s2, e2 = rel(p2[0], norm2), rel(p2[-1], norm2)
+            if (pointDistance(s1, e2) + pointDistance(e1, s2) <
+                pointDistance(s1, s2) + pointDistance(e1, e2)):
+                p2.reverse()
+    unmatched1 = [idx1[n] for n, a in enumerate(assignment) if a is None]
+    unmatched2 = [j for j in idx2 if j not in used]
+    return pairs, unmatched1, unmatched2
+
+def _itemTransform(item, transform):
+    """Compose transform with the transform attribute of item"""
+    import simpletransform
+    if item.get('transform'):
+        return simpletransform.composeTransform(
+            transform, simpletransform.parseTransform(item.get('transform')))
+    return transform
+
+def _layerItems(layer):
+    """Return list of (svg:path, transform) of a layer, including the
+    paths in nested groups. The transform is relative to the layer.
+    """
+    items = []
+    # transform and remaining children of the open groups
+    stack = [([[1.0,0.0,0.0],[0.0,1.0,0.0]], iter(layer.getchildren()))]
+    while stack:
+        transform, children = stack[-1]
+        for item in children:
+            if item.tag == SVG_G:
+                stack.append((_itemTransform(item, transform),
+                              iter(item.getchildren())))
+                break
+            if item.tag == SVG_PATH:
+                items.append((item, _itemTransform(item, transform)))
+        else:
+            stack.pop()
+    return items
+
+def iterLayers(source, flat=1.0, cache=None, profile=None, pool=None):
+    """Read the paths of the layers of an svg file while parsing it
+
+    Only one layer is kept in memory: the elements are freed as soon as
+    they are read, the Paths keep an empty svg:path with the id only.
+    Like getPaths() only paths inside of (nested) groups are read, not
+    those in defs, clipPath, mask, a or switch elements.
+    :param source:	file name or file object
+    :param pool:	process pool to flatten the paths of each layer in
+    :return:	iterator of (layer label, list of Paths)
+    """
+    from lxml import etree
+    identity = [[1.0,0.0,0.0],[0.0,1.0,0.0]]
+    depth = 0
+    layer = None
+    # transforms of the open groups of the current layer
+    stack = []
+    # depth of the element inside the layer that is not a group, if any
+    skip = None
+    for event, elem in etree.iterparse(source, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if skip is not None:
+                continue
+            if layer is not None and elem.tag not in (SVG_G, SVG_PATH):
+                skip = depth
+            elif elem.tag != SVG_G:
+                continue
+            elif layer is not None:
+                stack.append(_itemTransform(elem, stack[-1]))
+            elif depth == 2 and elem.get(INKSCAPE_GROUPMODE) == "layer":
+                layer = elem.get(INKSCAPE_LABEL) or elem.get('id')
+                paths = []
+                stack = [identity]
+            continue
+
+        depth -= 1
+        if skip is not None:
+            if skip == depth + 1:
+                skip = None
+        elif layer is not None:
+            if elem.tag == SVG_PATH:
+                attribs = {}
+                if elem.get('id'):
+                    attribs['id'] = elem.get('id')
+                transform = _itemTransform(elem, stack[-1])
+                if pool is None:
+                    p = Path(elem, flat, transform, cache, profile)
+                    p.tag = etree.Element(SVG_PATH, attribs)
+                    paths.append(p)
+                else:
+                    # keep the path data until the layer is complete
+                    attribs['d'] = elem.get('d') or ''
+                    paths.append((etree.Element(SVG_PATH, attribs), transform))
+            elif elem.tag == SVG_G:
+                stack.pop()
+                if not stack:
+                    if pool is not None:
+                        paths = _flattenItems([paths], flat, cache, profile,
+                                              pool)[0]
+                        for p in paths:
+                            del p.tag.attrib['d']
+                    yield layer, paths
+                    layer = None
+        # free what has been read
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+def getPaths(layer,flat=1.0,cache=None,profile=None):
+    "return list of lists of float pairs"
+    return [Path(item, flat, transform, cache, profile)
+            for item, transform in _layerItems(layer)]
+
+def applyTransform(mat, pt):
+    """Apply a 2x3 transformation matrix to the point pt in place"""
+    x, y = pt[0], pt[1]
+    pt[0] = mat[0][0]*x + mat[0][1]*y + mat[0][2]
+    pt[1] = mat[1][0]*x + mat[1][1]*y + mat[1][2]
+
+# smallest flatness used, finer values only cost time
+MIN_FLATNESS = 1e-3
+
+def _segmentDeviation(x0, y0, x1, y1, px, py):
+    """Distance of the points (px[k], py[k]) to the line segment (x0, y0) - (x1, y1)"""
+    dx = x1 - x0
+    dy = y1 - y0
+    l2 = dx*dx + dy*dy
+    dev = 0.0
+    for x, y in izip(px, py):
+        if l2 > 0.0:
+            t = ((x - x0) * dx + (y - y0) * dy) / l2
+            t = min(max(t, 0.0), 1.0)
+            d = math.hypot(x - x0 - t*dx, y - y0 - t*dy)
+        else:
+            d = math.hypot(x - x0, y - y0)
+        if d > dev:
+            dev = d
+    return dev
+
+def flattenCubic(p0, p1, p2, p3, tolerance, samples=16, maxlines=4096):
+    """Replace a cubic Bezier segment by lines
+
+    The chord error of a line of length s on a curve with curvature k is
+    about k*s*s/8, so the points are placed at equal steps of the integral
+    of sqrt(k) along the curve. The curve is sampled in one batch to
+    compute this integral. The deviation of the result is measured and the
+    number of lines raised until it is within tolerance. Curves where this
+    integral does not help, like straight ones turning back on themselves,
+    use equal steps of t instead.
+    :param tolerance:	max. deviation, at least MIN_FLATNESS
+    :param maxlines:	upper limit for the number of lines
+    :return:		list of points without p0, max. deviation
+    """
+    tolerance = max(tolerance, MIN_FLATNESS)
+    x0, y0 = p0
+    x1, y1 = p1
+    x2, y2 = p2
+    x3, y3 = p3
+    # B(t) = a*t^3 + b*t^2 + c*t + p0
+    ax = -x0 + 3*x1 - 3*x2 + x3
+    ay = -y0 + 3*y1 - 3*y2 + y3
+    bx = 3*x0 - 6*x1 + 3*x2
+    by = 3*y0 - 6*y1 + 3*y2
+    cx = 3*(x1 - x0)
+    cy = 3*(y1 - y0)
+
+    def evaluate(ts):
+        return ([((ax*t + bx)*t + cx)*t + x0 for t in ts],
+                [((ay*t + by)*t + cy)*t + y0 for t in ts])
+
+    # straight enough: control points close to the chord
+    if _segmentDeviation(x0, y0, x3, y3, (x1, x2), (y1, y2)) <= tolerance:
+        px, py = evaluate([0.25, 0.5, 0.75])
+        return [(x3, y3)], _segmentDeviation(x0, y0, x3, y3, px, py)
+
+    # sqrt(curvature) * speed = sqrt(|B' x B''| / |B'|)
+    ts = [i / float(samples) for i in xrange(samples + 1)]
+    weights = []
+    for t in ts:
+        dx = (3*ax*t + 2*bx)*t + cx
+        dy = (3*ay*t + 2*by)*t + cy
+        ddx = 6*ax*t + 2*bx
+        ddy = 6*ay*t + 2*by
+        speed = math.hypot(dx, dy)
+        if speed > 0.0:
+            weights.append(math.sqrt(abs(dx*ddy - dy*ddx) / speed))
+        else:
+            weights.append(math.sqrt(math.hypot(ddx, ddy)))
+    cumulative = [0.0]
+    for i in xrange(samples):
+        cumulative.append(cumulative[-1] + 0.5 * (weights[i] + weights[i+1]) / samples)
+    total = cumulative[-1]
+    n = max(1, min(int(math.ceil(total / math.sqrt(8.0 * tolerance))),
+                   maxlines))
+    if total <= 1e-9:
+        # no curvature to go by, e.g. a straight curve turning back
+        cumulative = ts
+        total = 1.0
+
+    for tries in xrange(8):
+        # parameters at equal steps of the integral
+        params = [0.0]
+        k = 0
+        for i in xrange(1, n):
+            w = total * i / n
+            while cumulative[k+1] < w:
+                k += 1
+            dw = cumulative[k+1] - cumulative[k]
+            f = dw > 0.0 and (w - cumulative[k]) / dw or 0.0
+            params.append(ts[k] + f / samples)
+        params.append(1.0)
+        xs, ys = evaluate(params)
+        # measure the deviation in the middle and quarters of each line
+        mids = []
+        for i in xrange(n):
+            t0, t1 = params[i], params[i+1]
+            mids.extend((t0 + 0.25*(t1-t0), t0 + 0.5*(t1-t0), t0 + 0.75*(t1-t0)))
+        mx, my = evaluate(mids)
+        deviation = 0.0
+        for i in xrange(n):
+            d = _segmentDeviation(xs[i], ys[i], xs[i+1], ys[i+1],
+                                  mx[3*i:3*i+3], my[3*i:3*i+3])
+            if d > deviation:
+                deviation = d
+        if deviation <= tolerance or n >= maxlines:
+            break
+        n = min(int(math.ceil(n * math.sqrt(deviation / tolerance))) + 1,
+                maxlines)
+    xs[-1], ys[-1] = x3, y3
+    return zip(xs[1:], ys[1:]), deviation
+
+def flattenPath(d, flat, transform, profile=None):
+    """Flatten svg path data
+    :return:	flat array of x, y coordinates, max. deviation
+    """
+    import cubicsuperpath
+    if profile is None:
+        profile = _noprofile
+    with profile.stage("parse"):
+        p = cubicsuperpath.parsePath(d)
+    with profile.stage("flatten"):
+        subpaths = []
+        deviation = 0.0
+        for sp in p:
+            # Bezier curves stay Bezier curves under affine transformations
+            for node in sp:
+                for pt in node:
+                    applyTransform(transform, pt)
+            sps = [tuple(sp[0][1])]
+            subpaths.append(sps)
+            for i in xrange(1, len(sp)):
+                points, dev = flattenCubic(sp[i-1][1], sp[i-1][2],
+                                           sp[i][0], sp[i][1], flat)
+                sps.extend(points)
+                if dev > deviation:
+                    deviation = dev
+
+        data = array('d')
+        for pt in mergePaths(sortPaths(subpaths)):
+            data.extend(pt)
+    profile.count("flatten", paths=1, subpaths=len(subpaths),
+                  points=len(data) // 2)
+    return data, deviation
+
+def _chunks(seq, n):
+    """Split seq into about n lists of consecutive entries"""
+    size = max(1, -(-len(seq) // n))
+    return [seq[i:i+size] for i in xrange(0, len(seq), size)]
+
+# Worker functions for the process pool. Points travel as strings of
+# doubles (array.tostring()), not as lists of tuples.
+
+def _flattenChunk(job):
+    items, flat = job
+    result = []
+    for d, transform in items:
+        data, deviation = flattenPath(d, flat, transform)
+        result.append((data.tostring(), deviation))
+    return result
+
+def _alignChunk(job):
+    pairs, tolerance, npoints = job
+    result = []
+    for s1, s2 in pairs:
+        d1 = array('d')
+        d1.fromstring(s1)
+        d2 = array('d')
+        d2.fromstring(s2)
+        p1 = zip(d1[0::2], d1[1::2])
+        p2 = zip(d2[0::2], d2[1::2])
+        alignLinePaths(p1, p2, tolerance, npoints)
+        d1 = array('d')
+        for pt in p1:
+            d1.extend(pt)
+        d2 = array('d')
+        for pt in p2:
+            d2.extend(pt)
+        result.append((d1.tostring(), d2.tostring()))
+    return result
+
+def getLayerPaths(layers, flat=1.0, cache=None, profile=None, pool=None):
+    """Flatten the paths of several layers, in parallel if a process pool
+    is given
+    :return:	list of lists of Paths, one per layer
+    """
+    if pool is None:
+        return [getPaths(layer, flat, cache, profile) for layer in layers]
+    return _flattenItems([_layerItems(layer) for layer in layers],
+                         flat, cache, profile, pool)
+
+def _flattenItems(items, flat, cache, profile, pool):
+    """Flatten lists of (svg:path, transform) with the process pool
+    :return:	list of lists of Paths
+    """
+    import multiprocessing
+    if profile is None:
+        profile = _noprofile
+    # flatten everything not found in the cache in one go
+    todo = []
+    data = {}
+    for n, layer in enumerate(items):
+        for m, (item, transform) in enumerate(layer):
+            if cache is not None:
+                with profile.stage("cache"):
+                    d = cache.get(cache.key(item.get('d'), transform, flat))
+                if d is not None:
+                    profile.count("cache", hits=1)
+                    data[n, m] = d
+                    continue
+            todo.append((n, m))
+    with profile.stage("flatten"):
+        chunks = _chunks(todo, 4 * multiprocessing.cpu_count())
+        jobs = [([(items[n][m][0].get('d'), items[n][m][1]) for n, m in chunk],
+                 flat) for chunk in chunks]
+        for chunk, result in zip(chunks, pool.map(_flattenChunk, jobs)):
+            for (n, m), (s, deviation) in zip(chunk, result):
+                d = array('d')
+                d.fromstring(s)
+                data[n, m] = d
+                profile.record("flatten", id=items[n][m][0].get('id'),
+                               points=len(d) // 2, deviation=deviation)
+                if cache is not None:
+                    item, transform = items[n][m]
+                    cache.put(cache.key(item.get('d'), transform, flat), d)
+    profile.count("flatten", paths=len(todo))
+    return [[Path(item, flat, transform, data=data[n, m])
+             for m, (item, transform) in enumerate(layer)]
+            for n, layer in enumerate(items)]
+
+def alignPaths(path1, path2, tolerance, npoints=0, skip=None, pool=None):
+    """Align all pairs of paths, in parallel chunks if a process pool is
+    given
+    :param skip:	optional list of booleans, pairs not to align
+    """
+    todo = [i for i in xrange(len(path1)) if not (skip and skip[i])]
+    if pool is None:
+        for i in todo:
+            alignLinePaths(path1[i], path2[i], tolerance, npoints)
+        return
+    import multiprocessing
+    chunks = _chunks(todo, 4 * multiprocessing.cpu_count())
+    jobs = [([(path1[i].array().tostring(), path2[i].array().tostring())
+              for i in chunk], tolerance, npoints) for chunk in chunks]
+    for chunk, result in zip(chunks, pool.map(_alignChunk, jobs)):
+        for i, (s1, s2) in zip(chunk, result):
+            d1 = array('d')
+            d1.fromstring(s1)
+            d2 = array('d')
+            d2.fromstring(s2)
+            path1[i].setPoints(d1)
+            path2[i].setPoints(d2)
+
+class _Stage(object):
+    """Context manager timing one run of a stage"""
+
+    __slots__ = ('profile', 'name', 'start')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        if self.name == self.profile.cstage:
+            self.profile.cprofile.enable()
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.time() - self.start
+        if self.name == self.profile.cstage:
+            self.profile.cprofile.disable()
+        stage = self.profile._stage(self.name)
+        stage["seconds"] += seconds
+        stage["calls"] += 1
+        return False
+
+class Profile(object):
+    """Wall time and counters for the stages of a run
+
+    Usage: with profile.stage("sort"): ...
+           profile.count("sort", paths=10)
+    :param cstage:	name of a stage to run under cProfile
+    """
+
+    def __init__(self, cstage=None):
+        self.start = time.time()
+        self.stages = OrderedDict()
+        self.cstage = cstage or None
+        self.cprofile = None
+        if self.cstage:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+
+    def _stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = OrderedDict(seconds=0.0, calls=0)
+        return self.stages[name]
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def count(self, name, **counters):
+        stage = self._stage(name)
+        for key, value in counters.iteritems():
+            stage[key] = stage.get(key, 0) + value
+
+    def record(self, name, **values):
+        """Add an entry to the list of items of a stage"""
+        self._stage(name).setdefault("items", []).append(values)
+
+    def report(self):
+        """Return the collected data as dict"""
+        result = OrderedDict()
+        result["seconds"] = time.time() - self.start
+        result["stages"] = self.stages
+        if self.cprofile:
+            import pstats, StringIO
+            out = StringIO.StringIO()
+            stats = pstats.Stats(self.cprofile, stream=out)
+            stats.sort_stats("cumulative").print_stats(30)
+            result["cprofile"] = out.getvalue()
+        return result
+
+    def write(self, filename=None):
+        """Write report as JSON to filename or stderr"""
+        import json
+        if filename:
+            f = open(filename, "w")
+            json.dump(self.report(), f, indent=1)
+            f.close()
+        else:
+            json.dump(self.report(), sys.stderr, indent=1)
+            sys.stderr.write("\n")
+
+class _NoStage(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class NoProfile(object):
+    """Stand in for Profile that does nothing"""
+
+    _nostage = _NoStage()
+
+    def stage(self, name):
+        return self._nostage
+
+    def count(self, name, **counters):
+        pass
+
+    def record(self, name, **values):
+        pass
+
+_noprofile = NoProfile()
+
+def _replaceFile(name, data):
+    """Write data to a temporary file and rename it to name
+
+    The temporary name contains the process id, so processes writing the
+    same file at once do not write into each other's temporary file.
+    """
+    tmp = "%s.%i.tmp" % (name, os.getpid())
+    try:
+        f = open(tmp, "wb")
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        os.rename(tmp, name)
+    except (IOError, OSError):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+class FlatCache(object):
+    """Cache for flattened paths
+
+    Keeps the most recently used paths in memory and all paths as binary
+    files in a directory. The oldest files get removed when the directory
+    grows larger than maxsize bytes.
+    """
+
+    version = "3"
+
+    def __init__(self, directory=None, maxsize=64<<20, maxentries=1024):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.maxentries = maxentries
+        self.entries = OrderedDict()
+        self.size = None
+
+    def key(self, d, transform, flat):
+        return hashlib.sha1("%s\0%r\0%r\0%s" % (
+                d, transform, flat, self.version)).hexdigest()
+
+    def get(self, key):
+        """Return flat array of point coordinates or None"""
+        if key in self.entries:
+            data = self.entries.pop(key)
+            self.entries[key] = data
+            return array('d', data)
+        if not self.directory:
+            return None
+        try:
+            f = open(os.path.join(self.directory, key), "rb")
+            data = array('d')
+            data.fromstring(f.read())
+            f.close()
+        except (IOError, OSError, ValueError):
+            return None
+        self._remember(key, data)
+        return array('d', data)
+
+    def put(self, key, data):
+        """Store flat array of point coordinates"""
+        self._remember(key, array('d', data))
+        if not self.directory:
+            return
+        data = data.tostring()
+        name = os.path.join(self.directory, key)
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            _replaceFile(name, data)
+        except (IOError, OSError):
+            return
+        if self.size is None:
+            self.size = sum(os.path.getsize(os.path.join(self.directory, n))
+                            for n in os.listdir(self.directory))
+        else:
+            self.size += len(data)
+        if self.size > self.maxsize:
+            self._evict()
+
+    def _remember(self, key, data):
+        self.entries[key] = data
+        while len(self.entries) > self.maxentries:
+            self.entries.popitem(last=False)
+
+    def _evict(self):
+        """Remove the oldest files until the cache is down to 3/4 of maxsize"""
+        files = []
+        for n in os.listdir(self.directory):
+            name = os.path.join(self.directory, n)
+            try:
+                files.append((os.path.getmtime(name), os.path.getsize(name), name))
+            except OSError:
+                pass
+        files.sort()
+        self.size = sum(f[1] for f in files)
+        for mtime, size, name in files:
+            if self.size <= self.maxsize * 3 // 4:
+                break
+            try:
+                os.remove(name)
+            except OSError:
+                continue
+            self.size -= size
+
+def segmentKey(p1, p2, settings):
+    """Fingerprint of a pair of sorted paths and the settings used to
+    turn them into moves
+
+    The end points are part of the key as sorting may reverse a path or
+    snap its ends to a neighbour.
+    """
+    return hashlib.sha1("%s\0%r\0%r\0%s\0%r\0%r\0%r" % (
+            p1.key, p1[0], p1[-1], p2.key, p2[0], p2[-1], settings)).hexdigest()
+
+def chainKeys(paths1, paths2, keys):
+    """Segment keys for moves that depend on the connected neighbours
+
+    Offsetting joins runs of connected paths, so each key is combined with
+    the keys of the whole run. A change anywhere in a run then recomputes
+    all its paths.
+    :param keys:	segment key or None per path pair
+    :return:		list of keys
+    """
+    idxs = [i for i in xrange(len(keys)) if keys[i]]
+    result = list(keys)
+    for chain in connectedRuns(idxs, paths1, paths2):
+        if len(chain) < 2:
+            continue
+        run = "\0".join(keys[i] for i in chain)
+        for i in chain:
+            result[i] = hashlib.sha1("%s\0%s" % (keys[i], run)).hexdigest()
+    return result
+
+class SegmentCache(object):
+    """Moves of the path pairs of the last export, kept in a sidecar file
+
+    A segment is a tuple of the aligned points of both sides (as strings
+    of doubles, None if single sided) and the list of machine moves.
+    Only the segments used in this run are written back by save().
+    """
+
+    version = "3"
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.segments = {}
+        self.used = {}
+        try:
+            f = open(filename, "rb")
+            version, segments = cPickle.load(f)
+            f.close()
+        except (IOError, OSError, EOFError, ValueError, TypeError,
+                cPickle.UnpicklingError):
+            return
+        if version == self.version:
+            self.segments = segments
+
+    def get(self, key):
+        """Return segment or None"""
+        segment = self.segments.get(key)
+        if segment is not None:
+            self.used[key] = segment
+        return segment
+
+    def put(self, key, segment):
+        self.used[key] = segment
+
+    def save(self):
+        try:
+            _replaceFile(self.filename, cPickle.dumps(
+                    (self.version, self.used), cPickle.HIGHEST_PROTOCOL))
+        except (IOError, OSError):
+            sys.stderr.write("Could not write %s\n" % self.filename)
+
+def formatStyle(style):
+    """Format a dict as value of a style attribute"""
+    return ";".join(["%s:%s" % (k, v) for k, v in style.iteritems()])
+
+class Path(object):
+    """Flattened svg:path
+
+    The points are stored as x, y pairs in one array of doubles. Indexing
+    and iteration return (x, y) tuples, so a Path can be used like a list
+    of points. Reversing only flips a flag until the array is needed.
+    """
+
+    __slots__ = ('tag', 'nr', 'key', 'data', '_reversed')
+
+    rainbow = [
+        0xFE0000, # red
+        0xFE7E00, # orange
+        0xFEFE00, # yellow
+        0x00FE00, # green
+        0x0000FE, # blue
+        0x6600FE, # indigo
+        0x8A00FE, # violet
+        ]
+
+    def __init__(self, tag, flatness, transform=[[1.0,0.0,0.0],[0.0,1.0,0.0]],
+                 cache=None, profile=None, data=None):
+        self.tag = tag
+        self.nr = 0
+        # fingerprint of the svg:path this was made from
+        self.key = hashlib.sha1("%s\0%r\0%r" % (
+                tag.get('d'), transform, flatness)).hexdigest()
+        self.data = array('d')
+        self._reversed = False
+        if profile is None:
+            profile = _noprofile
+        if data is not None:
+            # already flattened
+            self.data = data
+        elif cache is not None:
+            key = cache.key(tag.get('d'), transform, flatness)
+            with profile.stage("cache"):
+                data = cache.get(key)
+            if data is None:
+                self._readPath(tag, flatness, transform, profile)
+                cache.put(key, self.array())
+            else:
+                self.data = data
+                profile.count("cache", hits=1)
+        else:
+            self._readPath(tag, flatness, transform, profile)
+
+    def array(self):
+        """Return the points as flat array x0, y0, x1, y1, ..."""
+        if self._reversed:
+            d = self.data
+            new = array('d', d)
+            new[0::2] = d[-2::-2]
+            new[1::2] = d[-1::-2]
+            self.data = new
+            self._reversed = False
+        return self.data
+
+    def setPoints(self, points):
+        """Replace all points
+        :param points:	flat array of doubles or iterable of float pairs
+        """
+        if isinstance(points, array):
+            self.data = array('d', points)
+        elif isinstance(points, Path):
+            self.data = array('d', points.array())
+        else:
+            data = array('d')
+            for pt in points:
+                data.extend(pt)
+            self.data = data
+        self._reversed = False
+
+    def reverse(self):
+        self._reversed = not self._reversed
+
+    def extend(self, points):
+        if isinstance(points, Path):
+            self.array().extend(points.array())
+        else:
+            data = self.array()
+            for pt in points:
+                data.extend(pt)
+
+    def __len__(self):
+        return len(self.data) // 2
+
+    def __nonzero__(self):
+        return len(self.data) > 0
+
+    def _index(self, i):
+        n = len(self.data) // 2
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("Path index out of range")
+        if self._reversed:
+            i = n - 1 - i
+        return 2 * i
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in xrange(*i.indices(len(self)))]
+        i = self._index(i)
+        return (self.data[i], self.data[i+1])
+
+    def __setitem__(self, i, pt):
+        if isinstance(i, slice):
+            if i != slice(None, None, None):
+                raise ValueError("Only whole Path can be replaced")
+            self.setPoints(pt)
+            return
+        i = self._index(i)
+        self.data[i] = pt[0]
+        self.data[i+1] = pt[1]
+
+    def __iter__(self):
+        d = self.array()
+        return izip(d[0::2], d[1::2])
+
+    def __repr__(self):
+        return "Path(%r)" % (list(self),)
+
+    def _readPath(self, item, flat, transform, profile):
+        self.data, deviation = flattenPath(item.get('d'), flat, transform, profile)
+        self._reversed = False
+        profile.record("flatten", id=item.get('id'), points=len(self),
+                       deviation=deviation)
+
+    def setNr(self, nr):
+        self.nr = nr
+
+    def backToSVG(self, side, style):
+        # write back geometry
+        data = self.array()
+        self.tag.set("d", "M" + (" %.3f %.3f" * len(self)) % tuple(data))
+        # set style and color
+        value = self.rainbow[self.nr % 7] >> side
+
+        style = style.copy()
+        style["stroke"] = "#%06X" % value
+        self.tag.set("style", formatStyle(style))
+
+        # the points are relative to the layer now
+        p = self.tag
+        while p.getparent() is not None and p.getparent().tag != SVG_SVG:
+            if "transform" in p.attrib:
+                del p.attrib["transform"]
+            p = p.getparent()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 encoding=utf-8 textwidth=99
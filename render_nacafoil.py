@@ -20,11 +20,8 @@ import sys
 sys.path.append("/usr/share/inkscape/extensions")
 import os
 
-import inkex, simplestyle, simpletransform
-import naca
-import bisect, math, re
-
-from pprint import pprint
+import inkex, simplestyle
+import math
 
 f = 3.5433071 # mm to svg units
 
@@ -66,6 +63,9 @@ class Naca(inkex.Effect):
                                      action="store", type="int",
                                      dest="points",
                                      default=100,help="Points used for each side")		
+        self.OptionParser.add_option("--spacing", action="store", type="string",
+                                     dest="spacing", default="cosine",
+                                     help="Spacing of the points: cosine or linear")
 
         self.OptionParser.add_option("-b",   "--beamtype",
                                      action="store", type="int",
@@ -214,36 +214,29 @@ class Naca(inkex.Effect):
 
 
     def renderFoil(self, naca_num, size, twist=0.0):
-        l = len(naca_num)
-        if l == 4:
-            pts = naca.naca4(naca_num, self.options.points, False, True)
-        elif l == 5:
-            pts = naca.naca5(naca_num, self.options.points, False, True)
-        else:
-            #sys.stderr.write("Naca number must be 4 or 5 digits\n")
+        # only needed when a foil is rendered, not on every start
+        import airfoil
+        try:
+            # shared with the cache, must not be changed
+            profile = airfoil.profile(naca_num, self.options.points,
+                                      self.options.spacing)
+        except ValueError, e:
+            sys.stderr.write("%s\n" % e)
             return None, None
 
-        for i, pt in enumerate(pts):
-            pts[i] = list(pt)
-
-        upper = [ pts[0:self.options.points+1] ]
-        lower = [ pts[self.options.points:] + [pts[0]] ]
-
+        n = self.options.points
         beam_x = self.options.beampos/100.0
 
-        n_up, pt_up = self.pointAt(upper[0], beam_x)
-        n_low, pt_low = self.pointAt(lower[0], beam_x)
+        n_up, pt_up = self.pointAt(profile[0:n+1], beam_x)
+        n_low, pt_low = self.pointAt(profile[n:] + profile[:1], beam_x)
         beam_y = (pt_up[1] + pt_low[1]) / 2.0
 
-        trans = simpletransform.composeTransform(
-            simpletransform.parseTransform("rotate(%f)" % (-1*twist)),
-            [[size,0.0,-beam_x*size],
-             [0.0,size,-beam_y*size]])
+        trans = airfoil.placement(size, -twist, (beam_x, beam_y))
+        pts = airfoil.transform(profile, trans)
+        pt_up, pt_low = airfoil.transform((pt_up, pt_low), trans)
 
-        for pt in pts:
-            simpletransform.applyTransformToPoint(trans, pt)
-        for pt in pt_up, pt_low:
-            simpletransform.applyTransformToPoint(trans, pt)
+        upper = [ pts[0:n+1] ]
+        lower = [ pts[n:] + [pts[0]] ]
 
         if self.options.beamtype in [1,2,11,12]: # center beam
             if self.options.beamtype in [1,2]: # round
@@ -381,7 +374,7 @@ class Naca(inkex.Effect):
         foil1 = self.renderFoil(
             naca_num, self.options.size)
 
-        if not foil1: # error
+        if foil1[0] is None: # error
             return
 
         bbox = None
@@ -390,12 +383,13 @@ class Naca(inkex.Effect):
 
         if self.options.other:
             naca_num2 = self.options.naca2.strip()
-            if not re.match(r"^\d{4,5}$", naca_num2):
+            # "Same as XY" or empty, numbers are checked by renderFoil
+            if not any(c.isdigit() for c in naca_num2):
                 naca_num2 = naca_num
             foil2 = self.renderFoil(
                 naca_num2, self.options.size2,
                 self.options.twist)
-            if not foil2: # error
+            if foil2[0] is None: # error
                 return
             for p in foil2:
                 bbox = self.bbox(p, bbox)
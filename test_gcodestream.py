@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+'''
+Copyright (C) 2012, Florian Festi
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+'''
+"""Tests for gcodestream.py against a fake controller on a pseudo terminal
+
+Run with: python -m unittest test_gcodestream
+"""
+import os
+import pty
+import time
+import tty
+import threading
+import unittest
+
+from gcodestream import Streamer, StreamError
+
+class FakeController(threading.Thread):
+    """Answers every line on the master side of a pty like grbl
+
+    Keeps track of the bytes received but not answered yet, which must
+    never exceed the receive buffer.
+    """
+
+    def __init__(self, fd, delay=0.0, fail=None):
+        """
+        :param fd:	master side of the pty
+        :param delay:	seconds to "execute" each line before answering
+        :param fail:	line (without newline) to answer with an error
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.fd = fd
+        self.delay = delay
+        self.fail = fail
+        self.lines = []
+        self.unanswered = 0
+        self.maxunanswered = 0
+
+    def run(self):
+        buf = ""
+        while True:
+            try:
+                data = os.read(self.fd, 1024)
+            except OSError:
+                break
+            if not data:
+                break
+            buf += data
+            self.unanswered += len(data)
+            self.maxunanswered = max(self.maxunanswered, self.unanswered)
+            while "\n" in buf:
+                line, buf = buf.split("\n", 1)
+                self.lines.append(line)
+                if self.delay:
+                    time.sleep(self.delay)
+                self.unanswered -= len(line) + 1
+                if line == self.fail:
+                    os.write(self.fd, "error:20\n")
+                else:
+                    os.write(self.fd, "ok\n")
+
+class StreamerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.device = os.ttyname(self.slave)
+
+    def tearDown(self):
+        os.close(self.slave)
+        os.close(self.master)
+
+    def controller(self, **kw):
+        controller = FakeController(self.master, **kw)
+        controller.start()
+        return controller
+
+    def assertClosed(self, fd):
+        self.assertRaises(OSError, os.fstat, fd)
+
+    def testFlowControl(self):
+        controller = self.controller(delay=0.001)
+        streamer = Streamer(self.device, rxbuffer=32, timeout=5.0)
+        lines = ["G01X%iY%i" % (i, 2*i) for i in xrange(200)]
+        streamer.write("G21 (use mm)\n\n")
+        for line in lines:
+            streamer.write(line[:3] + " " + line[3:] + "\n")
+        streamer.close()
+        self.assertClosed(streamer.fd)
+
+        self.assertEqual(controller.lines, ["G21"] + lines)
+        self.assertTrue(0 < controller.maxunanswered <= 32)
+        stats = streamer.stats()
+        self.assertEqual(stats["lines"], 201)
+        self.assertEqual(stats["bytes"], sum(len(l) + 1 for l in controller.lines))
+        self.assertEqual(stats["errors"], 0)
+        # the controller is slower than the streamer, so the buffer fills up
+        self.assertTrue(0.5 < stats["average_fill"] <= 1.0)
+        self.assertTrue(stats["waiting_seconds"] > 0.0)
+
+    def testStopOnError(self):
+        controller = self.controller(delay=0.001, fail="G01X5")
+        streamer = Streamer(self.device, rxbuffer=16, timeout=5.0)
+        try:
+            for i in xrange(100):
+                streamer.write("G01 X%i\n" % i)
+            streamer.close()
+        except StreamError, e:
+            streamer.abort()
+            self.assertTrue("G01X5" in str(e))
+        else:
+            self.fail("No StreamError raised")
+        self.assertClosed(streamer.fd)
+        self.assertEqual(streamer.errors, [(6, "G01X5", "error:20")])
+        # sending stopped with at most a buffer full of lines after the error
+        self.assertTrue(streamer.lines < 6 + 16 // len("G01X5\n") + 1)
+        self.assertEqual(controller.lines[:6],
+                         ["G01X%i" % i for i in xrange(6)])
+
+    def testContinueOnError(self):
+        self.controller(fail="G01X5")
+        streamer = Streamer(self.device, timeout=5.0, stoponerror=False)
+        for i in xrange(10):
+            streamer.write("G01 X%i\n" % i)
+        streamer.close()
+        self.assertEqual(streamer.stats()["errors"], 1)
+        self.assertEqual(streamer.stats()["lines"], 10)
+
+    def testUnderruns(self):
+        self.controller()
+        streamer = Streamer(self.device, timeout=5.0)
+        for i in xrange(5):
+            streamer.write("G01 X%i\n" % i)
+            # the controller runs dry while we do not send anything
+            time.sleep(0.05)
+        streamer.close()
+        stats = streamer.stats()
+        self.assertEqual(stats["underruns"], 4)
+        self.assertEqual(stats["lines"], 5)
+        self.assertTrue(stats["average_fill"] <= len("G01X0\n") / 128.0)
+
+if __name__ == '__main__':
+    unittest.main()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 encoding=utf-8 textwidth=99
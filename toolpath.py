@@ -0,0 +1,687 @@
+#!/usr/bin/env python
+'''
+Copyright (C) 2012, Florian Festi
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, write to the Free Software
+Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+'''
+"""Toolpaths in machine coordinates
+
+Everything after the two sides are aligned: kerf offset, projection to
+the machine planes, simplification, arcs and feeds, and a binary file
+format for the aligned toolpath.
+
+Usage: toolpath.py [options] FILE.hwtp
+
+Writes G-code for a toolpath saved with hotwire.py --toolpath, without
+Inkscape. The options used when saving are the defaults.
+"""
+import sys
+import os
+import math
+import json
+import mmap
+import struct
+from array import array
+from itertools import izip
+from optparse import OptionParser
+
+from gcodewriter import GCodeWriter, lineFormatter, arcFormatter
+from hotwirecore import connectedRuns
+
+def projectToOuterPlane(z_xy, p_xy, z_uv, p_uv, width):
+    """front cutting plane at z==0
+       back cutting plane at z==width"""
+    x, y = p_xy
+    u, v = p_uv
+    d1 = float(z_xy)
+    d2 = float(z_uv - z_xy)
+    d3 = float(width - z_uv)
+    p_xy = [ x + d1*(x-u)/d2, y + d1*(y-v)/d2 ]
+    p_uv = [ u + d3*(u-x)/d2, v + d3*(v-y)/d2 ]
+
+    return p_xy, p_uv
+
+def machinePaths(paths1, paths2):
+    """Convert pairs of paths from svg to machine coordinates
+    :return:	generator of lists of (x, y, u, v) tuples in mm
+    """
+    s = 1 / 3.5433071 # scale svg units to mm
+    h = 1052.3622 # page height
+    for p1, p2 in zip(paths1, paths2):
+        if not p1:
+            continue
+        # reverse Y and V axis to go from svg to inkscape coordinates
+        yield [(s*x, (h-y)*s, s*u, (h-v)*s)
+               for (x, y), (u, v) in zip(p1, p2)]
+
+def projectPaths(paths, z_xy, z_uv, width):
+    """Project (x, y, u, v) points from the faces of the foam block at
+    depth z_xy and z_uv to the planes of the machine at 0 and width
+
+    Same as projectToOuterPlane, with the factors computed once.
+    :return:	list of lists of projected points
+    """
+    d = float(z_uv - z_xy)
+    a = z_xy / d
+    b = (width - z_uv) / d
+    a1 = 1.0 + a
+    b1 = 1.0 + b
+    return [[(a1*x - a*u, a1*y - a*v, b1*u - b*x, b1*v - b*y)
+             for x, y, u, v in points] for points in paths]
+
+def _normals(points, o):
+    """Left unit normals of the segments of one side of a path
+
+    Zero length segments get the normal of the segment before (or after).
+    :param o:	index of the first coordinate of the side (0 or 2)
+    """
+    normals = []
+    for k in xrange(len(points) - 1):
+        dx = points[k+1][o] - points[k][o]
+        dy = points[k+1][o+1] - points[k][o+1]
+        l = math.hypot(dx, dy)
+        if l > 1e-12:
+            normals.append((-dy / l, dx / l))
+        else:
+            normals.append(None)
+    last = None
+    for k in xrange(len(normals)):
+        if normals[k] is None:
+            normals[k] = last
+        last = normals[k]
+    last = (0.0, 0.0)
+    for k in xrange(len(normals)-1, -1, -1):
+        if normals[k] is None:
+            normals[k] = last
+        last = normals[k]
+    return normals
+
+def _joinSteps(n0, n1, offset, miterlimit, arcstep):
+    """Number of arc segments needed for a round join, 0 for a miter"""
+    cross = n0[0]*n1[1] - n0[1]*n1[0]
+    dot = n0[0]*n1[0] + n0[1]*n1[1]
+    if cross * offset >= 0.0 and dot > -0.999: # inner corner or straight
+        return 0
+    if 1.0 + dot > 2.0 / (miterlimit * miterlimit): # short enough miter
+        return 0
+    return max(1, int(math.ceil(abs(math.atan2(cross, dot)) / arcstep)))
+
+def _joinPoints(x, y, n0, n1, offset, round_, steps):
+    """Offset points for a corner at x, y, steps+1 points"""
+    if not round_:
+        # miter, repeated if the other side needs a round join
+        f = offset / max(1.0 + n0[0]*n1[0] + n0[1]*n1[1], 1e-3)
+        pt = (x + f*(n0[0]+n1[0]), y + f*(n0[1]+n1[1]))
+        return [pt] * (steps + 1)
+    a0 = math.atan2(n0[1], n0[0])
+    sweep = math.atan2(n0[0]*n1[1] - n0[1]*n1[0], n0[0]*n1[0] + n0[1]*n1[1])
+    return [(x + offset*math.cos(a0 + sweep*k/steps),
+             y + offset*math.sin(a0 + sweep*k/steps))
+            for k in xrange(steps + 1)]
+
+def _crossing(a, b, c, d):
+    """Parameters (t, s) where segment a-b crosses segment c-d or None"""
+    rx, ry = b[0]-a[0], b[1]-a[1]
+    sx, sy = d[0]-c[0], d[1]-c[1]
+    den = rx*sy - ry*sx
+    if abs(den) < 1e-12:
+        return None
+    qx, qy = c[0]-a[0], c[1]-a[1]
+    t = (qx*sy - qy*sx) / den
+    s = (qx*ry - qy*rx) / den
+    if 0.0 < t < 1.0 and 0.0 < s < 1.0:
+        return t
+    return None
+
+def removeLoops(points, window=32, marks=None):
+    """Cut out small loops where a path crosses itself
+
+    Only segments at most window segments apart are checked, which is
+    where offsetting inner corners creates loops. A loop on either side
+    is removed from both sides.
+    :param points:	list of (x, y, u, v) tuples
+    :param marks:	optional list of indices into points, moved along
+    			with the points they refer to
+    :return:		list of points
+    """
+    result = list(points)
+    i = 0
+    while i < len(result) - 3:
+        a, b = result[i], result[i+1]
+        # bounding boxes of segment i on both sides
+        x0, x1 = min(a[0], b[0]), max(a[0], b[0])
+        y0, y1 = min(a[1], b[1]), max(a[1], b[1])
+        u0, u1 = min(a[2], b[2]), max(a[2], b[2])
+        v0, v1 = min(a[3], b[3]), max(a[3], b[3])
+        for j in xrange(i + 2, min(i + window, len(result) - 1)):
+            c, d = result[j], result[j+1]
+            t1 = t2 = None
+            if not (max(c[0], d[0]) < x0 or min(c[0], d[0]) > x1 or
+                    max(c[1], d[1]) < y0 or min(c[1], d[1]) > y1):
+                t1 = _crossing(a[:2], b[:2], c[:2], d[:2])
+            if not (max(c[2], d[2]) < u0 or min(c[2], d[2]) > u1 or
+                    max(c[3], d[3]) < v0 or min(c[3], d[3]) > v1):
+                t2 = _crossing(a[2:4], b[2:4], c[2:4], d[2:4])
+            if t1 is None and t2 is None:
+                continue
+            if t1 is None:
+                t1 = t2
+            if t2 is None:
+                t2 = t1
+            pt = (a[0] + t1*(b[0]-a[0]), a[1] + t1*(b[1]-a[1]),
+                  a[2] + t2*(b[2]-a[2]), a[3] + t2*(b[3]-a[3]))
+            result[i+1:j+1] = [pt]
+            if marks:
+                # marks inside the loop end up on the crossing
+                for k, m in enumerate(marks):
+                    if m > j:
+                        marks[k] = m - (j - i - 1)
+                    elif m > i:
+                        marks[k] = i + 1
+            break
+        else:
+            i += 1
+    return result
+
+def _offsetPoints(points, offset, miterlimit, arcstep):
+    """Offset points without removing loops
+    :return:	list of points, index of the last new point per input point
+    """
+    n = len(points)
+    nxy = _normals(points, 0)
+    nuv = _normals(points, 2)
+    closed = points[0] == points[-1] and n > 2
+
+    def corner(k, i0, i1):
+        sxy = _joinSteps(nxy[i0], nxy[i1], offset, miterlimit, arcstep)
+        suv = _joinSteps(nuv[i0], nuv[i1], offset, miterlimit, arcstep)
+        s = max(sxy, suv)
+        pxy = _joinPoints(points[k][0], points[k][1], nxy[i0], nxy[i1],
+                          offset, sxy, s)
+        puv = _joinPoints(points[k][2], points[k][3], nuv[i0], nuv[i1],
+                          offset, suv, s)
+        return [pt1 + pt2 for pt1, pt2 in izip(pxy, puv)]
+
+    if closed:
+        start = corner(0, -1, 0)
+        result = start[-1:]
+    else:
+        x, y, u, v = points[0]
+        result = [(x + offset*nxy[0][0], y + offset*nxy[0][1],
+                   u + offset*nuv[0][0], v + offset*nuv[0][1])]
+    ends = [0]
+    for k in xrange(1, n-1):
+        result.extend(corner(k, k-1, k))
+        ends.append(len(result) - 1)
+    if closed:
+        result.extend(start)
+    else:
+        x, y, u, v = points[-1]
+        result.append((x + offset*nxy[-1][0], y + offset*nxy[-1][1],
+                       u + offset*nuv[-1][0], v + offset*nuv[-1][1]))
+    ends.append(len(result) - 1)
+    return result, ends
+
+def offsetPath(points, offset, miterlimit=2.0, arcstep=math.radians(15)):
+    """Move both sides of a path sideways to compensate the cut width
+
+    Corners get miter joins. Outer corners whose miter would be longer
+    than miterlimit * offset get round joins instead. Both sides get the
+    same number of points, so they stay in lockstep. Loops created at
+    inner corners are removed afterwards.
+    :param points:	list of (x, y, u, v) tuples
+    :param offset:	distance, positive to the left of the direction of travel
+    :return:		list of points
+    """
+    if len(points) < 2 or not offset:
+        return points
+    return removeLoops(_offsetPoints(points, offset, miterlimit, arcstep)[0])
+
+def offsetPaths(paths, offset, miterlimit=2.0, arcstep=math.radians(15)):
+    """Same as offsetPath for a list of paths
+
+    Runs of connected paths are offset as one path, so the corners
+    between them get joined, too, and split again afterwards. The
+    previous path ends where the join of such a corner ends.
+    :param paths:	list of lists of (x, y, u, v) tuples
+    :return:		list of lists of points
+    """
+    result = list(paths)
+    idxs = [i for i, p in enumerate(paths) if p]
+    for chain in connectedRuns(idxs, paths, paths):
+        if len(chain) == 1 or not offset:
+            for i in chain:
+                result[i] = offsetPath(paths[i], offset, miterlimit, arcstep)
+            continue
+        joined = list(paths[chain[0]])
+        cuts = []
+        for i in chain[1:]:
+            cuts.append(len(joined) - 1)
+            joined.extend(paths[i][1:])
+        points, ends = _offsetPoints(joined, offset, miterlimit, arcstep)
+        marks = [ends[k] for k in cuts]
+        points = removeLoops(points, marks=marks)
+        start = 0
+        for i, m in izip(chain, marks):
+            result[i] = points[start:m+1]
+            start = m
+        result[chain[-1]] = points[start:]
+    return result
+
+def simplifyPath(points, tolerance):
+    """Remove points that lie on the line between their neighbours
+
+    Douglas-Peucker for (x, y, u, v) points. Both sides are checked at
+    the same position along the line, so a point is only dropped if the
+    XY and the UV side stay within tolerance and in lockstep.
+    :param points:	list of (x, y, u, v) tuples
+    :param tolerance:	maximal distance of a removed point to the line
+    :return:		list of the remaining points
+    """
+    n = len(points)
+    if n < 3:
+        return points
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    tol2 = tolerance * tolerance
+    stack = [(0, n-1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        ax, ay, au, av = points[i]
+        bx, by, bu, bv = points[j]
+        dx, dy, du, dv = bx-ax, by-ay, bu-au, bv-av
+        dd = dx*dx + dy*dy + du*du + dv*dv
+        worst = -1.0
+        worstk = i
+        for k in xrange(i+1, j):
+            px, py, pu, pv = points[k]
+            px -= ax
+            py -= ay
+            pu -= au
+            pv -= av
+            t = 0.0
+            if dd > 0.0:
+                t = (px*dx + py*dy + pu*du + pv*dv) / dd
+                t = min(max(t, 0.0), 1.0)
+            ex, ey, eu, ev = px-t*dx, py-t*dy, pu-t*du, pv-t*dv
+            e = max(ex*ex + ey*ey, eu*eu + ev*ev)
+            if e > worst:
+                worst = e
+                worstk = k
+        if worst > tol2:
+            keep[worstk] = True
+            stack.append((i, worstk))
+            stack.append((worstk, j))
+    return [pt for pt, k in izip(points, keep) if k]
+
+def _circle(a, b, c):
+    """Center of the circle through three points or None if collinear"""
+    ax, ay = a
+    bx, by = b
+    cx, cy = c
+    d = 2.0 * (ax*(by-cy) + bx*(cy-ay) + cx*(ay-by))
+    if abs(d) < 1e-12:
+        return None
+    a2 = ax*ax + ay*ay
+    b2 = bx*bx + by*by
+    c2 = cx*cx + cy*cy
+    return ((a2*(by-cy) + b2*(cy-ay) + c2*(ay-by)) / d,
+            (a2*(cx-bx) + b2*(ax-cx) + c2*(bx-ax)) / d)
+
+def _arcSide(points, i, j, o, tolerance, maxradius, maxstep=math.radians(20)):
+    """Check if points[i..j] lie on an arc, using coordinates o and o+1
+
+    Consecutive points may be at most maxstep apart, so polygons with
+    corners on a circle are not mistaken for arcs.
+    :return:	(center x, center y, radius, [angle from start]) or None
+    """
+    m = (i + j) // 2
+    a = (points[i][o], points[i][o+1])
+    center = _circle(a, (points[m][o], points[m][o+1]),
+                     (points[j][o], points[j][o+1]))
+    if center is None:
+        return None
+    cx, cy = center
+    r = math.hypot(a[0]-cx, a[1]-cy)
+    if r > maxradius:
+        return None
+    pi = math.pi
+    prev = math.atan2(a[1]-cy, a[0]-cx)
+    total = 0.0
+    sign = 0.0
+    angles = [0.0]
+    for k in xrange(i+1, j+1):
+        x, y = points[k][o], points[k][o+1]
+        if abs(math.hypot(x-cx, y-cy) - r) > tolerance:
+            return None
+        angle = math.atan2(y-cy, x-cx)
+        step = angle - prev
+        if step > pi:
+            step -= 2*pi
+        elif step <= -pi:
+            step += 2*pi
+        if step == 0.0 or step * sign < 0.0 or abs(step) > maxstep:
+            return None
+        sign = step
+        total += step
+        angles.append(total)
+        prev = angle
+    if abs(total) >= 2*pi - 1e-6:
+        return None
+    return cx, cy, r, angles
+
+def _arc(points, i, j, tolerance, maxradius):
+    """Return arc move from points[i] to points[j] or None
+
+    The UV side has to be the XY arc shifted by a constant offset, so the
+    same I and J describe the arc of both sides.
+    """
+    xy = _arcSide(points, i, j, 0, tolerance, maxradius)
+    if xy is None:
+        return None
+    du = points[i][2] - points[i][0]
+    dv = points[i][3] - points[i][1]
+    for k in xrange(i+1, j+1):
+        p = points[k]
+        if (abs(p[2] - p[0] - du) > tolerance or
+            abs(p[3] - p[1] - dv) > tolerance):
+            return None
+    x, y, u, v = points[j][:4]
+    return (x, y, u, v, xy[0] - points[i][0], xy[1] - points[i][1],
+            xy[3][-1] < 0.0)
+
+def fitArcs(points, tolerance, minpoints=4, maxradius=10000.0):
+    """Replace runs of points on circular arcs by arc moves
+
+    Arcs are only used where the UV side follows the XY arc at a constant
+    offset. The controller has to move U and V along the arc given by I
+    and J, too. Controllers moving U and V linearly during G02/G03 need
+    lines instead.
+    :param points:	list of (x, y, u, v) tuples
+    :param tolerance:	maximal distance of the points to the arc
+    :param minpoints:	minimal number of points replaced by an arc
+    :return:		list of (x, y, u, v) line and
+    			(x, y, u, v, i, j, clockwise) arc moves
+    """
+    n = len(points)
+    if n < minpoints:
+        return points
+    result = [points[0]]
+    i = 0
+    while i < n - 1:
+        # find longest arc starting at i: double length, then bisect
+        good = None
+        step = minpoints - 1
+        while i + step < n:
+            arc = _arc(points, i, i + step, tolerance, maxradius)
+            if arc is None:
+                break
+            good = (i + step, arc)
+            step *= 2
+        if good is None:
+            result.append(points[i+1])
+            i += 1
+            continue
+        lo, hi = good[0], min(i + step, n)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            arc = _arc(points, i, mid, tolerance, maxradius)
+            if arc is None:
+                hi = mid
+            else:
+                lo = mid
+                good = (mid, arc)
+        result.append(good[1])
+        i = good[0]
+    return result
+
+def planFeeds(paths, speed, step=0.05):
+    """Feed rates keeping the longer side of each move at speed
+
+    The F word is taken to apply to the XY distance of a move, as long as
+    XY moves at all, and to UV otherwise. Feeds are rounded down to levels
+    speed * (1 - step)**k. They drop as soon as needed but are only raised
+    by two levels or more, so a wanted feed wobbling around a level does not
+    produce a new F word for every move. No side ever moves faster than
+    speed.
+    :param paths:	list of lists of (x, y, u, v) points
+    :param speed:	cutting speed for the faster side
+    :param step:	relative distance of the feed levels
+    :return:		list of lists of feeds, one per point
+    """
+    hypot = math.hypot
+    if 0.0 < step < 1.0:
+        ratio = -math.log(1.0 - step)
+    else:
+        ratio = None
+    current = 0
+    last = None
+    result = []
+    for points in paths:
+        feeds = []
+        for pt in points:
+            need = speed
+            if last is not None:
+                dxy = hypot(pt[0]-last[0], pt[1]-last[1])
+                duv = hypot(pt[2]-last[2], pt[3]-last[3])
+                if dxy > 0.0 and duv > dxy:
+                    need = speed * dxy / duv
+            if ratio is None:
+                feeds.append(max(math.floor(need), 1.0))
+            else:
+                # level at or below need, 1e-9 against rounding
+                level = 0
+                if need < speed:
+                    level = int(math.ceil(math.log(speed / need) / ratio - 1e-9))
+                if level > current or level < current - 1:
+                    current = level
+                feeds.append(max(math.floor(speed * math.exp(-current * ratio)), 1.0))
+            last = pt
+        result.append(feeds)
+    return result
+
+def machineMoves(paths, options, twosided):
+    """Apply the options for kerf, projection, simplification and arcs
+    :param paths:	list of lists of (x, y, u, v) points in mm
+    :param options:	object with the attributes of the HotWire options
+    :param twosided:	True if the sides come from different layers
+    :return:		list of lists of moves, cutter correction
+    """
+    correction = options.ccorrection
+    if options.softkerf and correction:
+        # left correction puts the wire on the right (G42)
+        offset = options.cdiam * 0.5 * [0, -1, 1][correction]
+        # connected paths share their corners
+        paths = offsetPaths(paths, offset)
+        correction = 0
+    if twosided:
+        if options.uvplane == options.xyplane:
+            sys.stderr.write("XY and UV plane must not be at the same depth\n")
+        else:
+            paths = projectPaths(paths, options.xyplane,
+                                 options.uvplane, options.mwidth)
+    if options.simplify > 0.0:
+        before = sum(len(p) for p in paths)
+        paths = [simplifyPath(p, options.simplify) for p in paths]
+        after = sum(len(p) for p in paths)
+        sys.stderr.write("Simplifying removed %i of %i lines\n" %
+                         (before - after, before))
+
+    if options.arcs and not options.uvarcs:
+        sys.stderr.write("Arcs need a controller moving U/V along the arc, "
+                         "writing lines\n")
+    elif options.arcs:
+        before = sum(len(p) for p in paths)
+        paths = [fitArcs(p, options.arctolerance) for p in paths]
+        arcs = sum(len(m) == 7 for p in paths for m in p)
+        sys.stderr.write("Arc fitting replaced %i lines by %i arcs\n" %
+                         (before - sum(len(p) for p in paths) + arcs, arcs))
+    return paths, correction
+
+# Toolpath files:
+#   header	magic, version, number of paths, number of points,
+#   		length of the metadata, offset of the path index
+#   metadata	JSON, padded to 8 bytes
+#   points	x, y, u, v doubles per point
+#   index	number of paths + 1 start points as unsigned 64 bit ints
+# All numbers are little endian.
+
+_header = struct.Struct("<4sIIQIQ")
+
+class ToolpathError(Exception):
+    pass
+
+def writeToolpath(filename, paths, metadata=None):
+    """Save paths in machine coordinates
+    :param paths:	iterable of lists of (x, y, u, v) points
+    :param metadata:	dict, stored as JSON
+    """
+    meta = json.dumps(metadata or {})
+    meta += " " * (-(_header.size + len(meta)) % 8)
+    # unique per process, so parallel exports do not share it
+    tmp = "%s.%i.tmp" % (filename, os.getpid())
+    f = open(tmp, "wb")
+    f.write(_header.pack(Toolpath.magic, Toolpath.version, 0, 0, 0, 0))
+    f.write(meta)
+    starts = [0]
+    for points in paths:
+        data = array('d')
+        for pt in points:
+            data.extend(pt[:4])
+        if sys.byteorder != "little":
+            data.byteswap()
+        data.tofile(f)
+        starts.append(starts[-1] + len(points))
+    index = f.tell()
+    f.write(struct.pack("<%iQ" % len(starts), *starts))
+    f.seek(0)
+    f.write(_header.pack(Toolpath.magic, Toolpath.version, len(starts) - 1,
+                         starts[-1], len(meta), index))
+    f.close()
+    os.rename(tmp, filename)
+
+class Toolpath(object):
+    """Memory mapped toolpath file
+
+    Behaves like a read only list of paths. A path is a list of
+    (x, y, u, v) tuples, read from the file when it is accessed.
+    """
+
+    magic = "HWTP"
+    version = 1
+
+    def __init__(self, filename):
+        f = open(filename, "rb")
+        try:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        if len(self.map) < _header.size:
+            raise ToolpathError("%s: not a toolpath file" % filename)
+        magic, version, npaths, npoints, metalen, index = _header.unpack_from(
+            self.map, 0)
+        if magic != self.magic:
+            raise ToolpathError("%s: not a toolpath file" % filename)
+        if version != self.version:
+            raise ToolpathError("%s: unsupported version %i" % (filename, version))
+        self.npoints = npoints
+        self.metadata = json.loads(self.map[_header.size:_header.size+metalen])
+        self.offset = _header.size + metalen
+        self.starts = struct.unpack_from("<%iQ" % (npaths + 1), self.map, index)
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Toolpath index out of range")
+        start, end = self.starts[i], self.starts[i+1]
+        data = struct.unpack_from("<%id" % (4 * (end - start)), self.map,
+                                  self.offset + 32 * start)
+        return zip(data[0::4], data[1::4], data[2::4], data[3::4])
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def close(self):
+        self.map.close()
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage="%prog [options] FILE.hwtp")
+    parser.add_option("-o", "--output", action="store", type="string",
+                      dest="output", default="-",
+                      help="G-code file, default stdout")
+    parser.add_option("--cspeed", action="store", type="float", dest="cspeed")
+    parser.add_option("--mspeed", action="store", type="float", dest="mspeed")
+    parser.add_option("--ccorrection", action="store", type="int",
+                      dest="ccorrection")
+    parser.add_option("--cdiam", action="store", type="float", dest="cdiam")
+    parser.add_option("--softkerf", action="store", type="int", dest="softkerf")
+    parser.add_option("--mwidth", action="store", type="float", dest="mwidth")
+    parser.add_option("--xyplane", action="store", type="float", dest="xyplane")
+    parser.add_option("--uvplane", action="store", type="float", dest="uvplane")
+    parser.add_option("--simplify", action="store", type="float", dest="simplify")
+    parser.add_option("--arcs", action="store", type="int", dest="arcs")
+    parser.add_option("--arctolerance", action="store", type="float",
+                      dest="arctolerance")
+    parser.add_option("--uvarcs", action="store", type="int", dest="uvarcs")
+    parser.add_option("--feedplanning", action="store", type="int",
+                      dest="feedplanning")
+    parser.add_option("--feedstep", action="store", type="float", dest="feedstep")
+    parser.add_option("--axes", action="store", type="string", dest="axes")
+    parser.add_option("--estimate", action="store_true", dest="estimate",
+                      default=False, help="Print the estimated run time")
+    parser.add_option("--accel", action="store", type="float", dest="accel")
+    parser.add_option("--deviation", action="store", type="float",
+                      dest="deviation")
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("Expected one toolpath file")
+
+    toolpath = Toolpath(args[0])
+    # settings from the export unless given on the command line
+    for name, value in toolpath.metadata.get("options", {}).items():
+        if getattr(options, name, None) is None:
+            setattr(options, name, value)
+    paths, correction = machineMoves(list(toolpath), options,
+                                     toolpath.metadata.get("twosided", False))
+    toolpath.close()
+
+    speed = min(options.cspeed, options.mspeed)
+    feeds = None
+    if options.feedplanning:
+        feeds = planFeeds(paths, speed, options.feedstep / 100.0)
+    cd = options.cdiam
+    writer = GCodeWriter(options.output, speed,
+                         ["G40", "G42 D%.2f" % cd, "G41 D%.2f" % cd][correction],
+                         lineFormatter(options.axes), arcFormatter(options.axes))
+    writer.writePaths(paths, feeds)
+    writer.close()
+
+    if options.estimate:
+        from cycletime import estimatePaths
+        sys.stderr.write(estimatePaths(paths, speed, options.mspeed, feeds,
+                                       accel=options.accel,
+                                       deviation=options.deviation).report())
+
+if __name__ == '__main__':
+    main()
+
+# vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 encoding=utf-8 textwidth=99